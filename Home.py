@@ -1,5 +1,7 @@
 import streamlit as st
-from PIL import Image
+
+from curry.api import serve_alongside_ui
+from curry.filters import load_image
 
 
 st.set_page_config(
@@ -8,8 +10,10 @@ st.set_page_config(
     layout='centered'
 )
 
-image = Image.open('analytics.png')
-st.sidebar.image(image, width=120)
+# API dos KPIs no mesmo processo (apenas com CURRY_API_PORT definida)
+serve_alongside_ui()
+
+st.sidebar.image(load_image('analytics.png'), width=120)
 
 st.sidebar.markdown('# Curry Company')
 st.sidebar.markdown('## Fastest Delivery in Town')
@@ -0,0 +1,3 @@
+'''
+    Scripts de medição de desempenho do Growth Dashboard.
+'''
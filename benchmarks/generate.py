@@ -0,0 +1,147 @@
+#================================================================================
+#==========        Gerador de pedidos sintéticos
+#================================================================================
+
+'''
+    Gera CSVs sintéticos com o mesmo esquema e as mesmas peculiaridades do
+    dataset/train.csv: IDs e textos com espaço no final, marcadores 'NaN ',
+    tempo no formato '(min) NN', as seis condições climáticas (mais
+    'conditions NaN'), os quatro níveis de trânsito e os três tipos de cidade.
+
+    Uso:
+        python -m benchmarks.generate 1M benchmarks/data/orders_1M.csv
+'''
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+SCALES = {'45k': 45593, '1M': 1000000, '10M': 10000000}
+
+CITIES = ['Metropolitian ', 'Urban ', 'Semi-Urban ', 'NaN ']
+CITY_WEIGHTS = [0.745, 0.222, 0.004, 0.029]
+
+TRAFFIC = ['Low ', 'Jam ', 'Medium ', 'High ', 'NaN ']
+TRAFFIC_WEIGHTS = [0.340, 0.312, 0.240, 0.098, 0.010]
+
+WEATHER = ['conditions Fog', 'conditions Stormy', 'conditions Cloudy', 'conditions Sandstorms',
+           'conditions Windy', 'conditions Sunny', 'conditions NaN']
+WEATHER_WEIGHTS = [0.169, 0.167, 0.167, 0.166, 0.164, 0.156, 0.011]
+
+ORDER_TYPES = ['Snack ', 'Meal ', 'Drinks ', 'Buffet ']
+VEHICLES = ['motorcycle ', 'scooter ', 'electric_scooter ', 'bicycle ']
+FESTIVAL = ['No ', 'Yes ', 'NaN ']
+FESTIVAL_WEIGHTS = [0.975, 0.020, 0.005]
+
+REGIONS = ['INDO', 'BANG', 'COIMB', 'CHEN', 'HYD', 'RANCHI', 'MYS', 'DEH', 'KOC', 'PUNE',
+           'LUDH', 'KNP', 'MUM', 'KOL', 'JAP', 'SUR', 'GOA', 'AURG', 'AGR', 'VAD', 'ALH', 'BHP']
+
+DATES = pd.date_range('2022-02-11', '2022-04-06').strftime('%d-%m-%Y').to_numpy()
+
+ORDER_TIMES = np.array(['{:02d}:{:02d}:00'.format(h, m) for h in range(8, 24) for m in (0, 15, 30, 45)], dtype=object)
+PICKED_TIMES = np.array(['{:02d}:{:02d}:00'.format(h, m) for h in range(8, 24) for m in (5, 20, 35, 50)], dtype=object)
+
+# Proporção aproximada de pedidos por entregador no dataset original
+ORDERS_PER_COURIER = 35
+
+
+def with_missing(valores, rng, fraction):
+    
+    '''
+        Esta função troca uma fração dos valores pelo marcador 'NaN '.
+    '''
+    
+    valores = valores.astype(object)
+    valores[rng.random(len(valores)) < fraction] = 'NaN '
+    return valores
+
+
+def couriers(n_orders, rng):
+    
+    '''
+        Esta função cria o cadastro de entregadores (ID e restaurante de
+        origem, com coordenadas).
+    '''
+    
+    n = max(50, n_orders // ORDERS_PER_COURIER)
+    restaurante = np.arange(n) // 3
+    ids = np.array(['{}RES{:02d}DEL{:02d} '.format(REGIONS[r % len(REGIONS)], r // len(REGIONS), i % 3 + 1)
+                    for i, r in enumerate(restaurante)], dtype=object)
+    
+    n_restaurantes = restaurante[-1] + 1
+    lat = rng.uniform(9, 31, n_restaurantes)[restaurante]
+    lon = rng.uniform(72, 89, n_restaurantes)[restaurante]
+    return ids, lat, lon
+
+
+def generate_orders(n, seed=0, first_id=0, courier_table=None):
+    
+    '''
+        Esta função gera n pedidos sintéticos no formato bruto do CSV.
+        
+        Input: Quantidade de linhas, semente, primeiro ID e (opcional) o
+               cadastro de entregadores, para gerar blocos consistentes
+        Output: Dataframe bruto
+    '''
+    
+    rng = np.random.default_rng(seed)
+    ids, lat, lon = courier_table if courier_table is not None else couriers(n, rng)
+    
+    c = rng.integers(0, len(ids), n)
+    idade = rng.integers(15, 40, n)
+    sem_cadastro = rng.random(n) < 0.04
+    
+    df = pd.DataFrame({
+        'ID': np.char.add(np.char.add('0x', np.char.mod('%05x', np.arange(first_id, first_id + n))), ' ').astype(object),
+        'Delivery_person_ID': ids[c],
+        'Delivery_person_Age': np.where(sem_cadastro, 'NaN ', idade.astype(str)).astype(object),
+        'Delivery_person_Ratings': np.where(sem_cadastro, 'NaN ', np.round(rng.uniform(2.5, 5.0, n), 1).astype(str)).astype(object),
+        'Restaurant_latitude': lat[c],
+        'Restaurant_longitude': lon[c],
+        'Delivery_location_latitude': lat[c] + rng.uniform(-0.15, 0.15, n),
+        'Delivery_location_longitude': lon[c] + rng.uniform(-0.15, 0.15, n),
+        'Order_Date': DATES[rng.integers(0, len(DATES), n)],
+        'Time_Orderd': with_missing(ORDER_TIMES[rng.integers(0, len(ORDER_TIMES), n)], rng, 0.04),
+        'Time_Order_picked': PICKED_TIMES[rng.integers(0, len(PICKED_TIMES), n)],
+        'Weatherconditions': np.array(WEATHER, dtype=object)[rng.choice(len(WEATHER), n, p=WEATHER_WEIGHTS)],
+        'Road_traffic_density': np.array(TRAFFIC, dtype=object)[rng.choice(len(TRAFFIC), n, p=TRAFFIC_WEIGHTS)],
+        'Vehicle_condition': rng.integers(0, 4, n),
+        'Type_of_order': np.array(ORDER_TYPES, dtype=object)[rng.integers(0, len(ORDER_TYPES), n)],
+        'Type_of_vehicle': np.array(VEHICLES, dtype=object)[rng.integers(0, len(VEHICLES), n)],
+        'multiple_deliveries': with_missing(rng.integers(0, 4, n).astype(str), rng, 0.02),
+        'Festival': np.array(FESTIVAL, dtype=object)[rng.choice(len(FESTIVAL), n, p=FESTIVAL_WEIGHTS)],
+        'City': np.array(CITIES, dtype=object)[rng.choice(len(CITIES), n, p=CITY_WEIGHTS)],
+        'Time_taken(min)': np.char.add('(min) ', rng.integers(10, 55, n).astype(str)).astype(object),
+    })
+    return df
+
+
+def write_orders_csv(path, n, seed=0, chunksize=1000000):
+    
+    '''
+        Esta função grava n pedidos sintéticos em CSV, em blocos, para que a
+        geração de 10M de linhas não precise caber inteira na memória.
+    '''
+    
+    courier_table = couriers(n, np.random.default_rng(seed))
+    for i, inicio in enumerate(range(0, n, chunksize)):
+        bloco = generate_orders(min(chunksize, n - inicio), seed=seed + i + 1, first_id=inicio, courier_table=courier_table)
+        bloco.to_csv(path, index=False, mode='w' if i == 0 else 'a', header=(i == 0))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    
+    escala, path = argv
+    n = SCALES[escala] if escala in SCALES else int(escala)
+    write_orders_csv(path, n)
+    print('{} pedidos gravados em {}'.format(n, path))
+
+
+if __name__ == '__main__':
+    main()
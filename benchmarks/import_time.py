@@ -0,0 +1,139 @@
+#================================================================================
+#==========        Tempo de importação das páginas
+#================================================================================
+
+'''
+    Mede o tempo de importação de módulos na partida a frio de cada página
+    (python -X importtime) e lista os módulos mais caros, para acompanhar o
+    custo das importações no primeiro acesso de um worker novo.
+
+    Uso:
+        python -m benchmarks.import_time [--pages Home.py,pages/1_visao_empresa.py] [--top 8]
+        python -m benchmarks.import_time --baseline HEAD~1
+
+    Cada página roda em um processo novo, em modo bare (sem servidor), com a
+    visão padrão. O streamlit é importado antes da página e fica fora da conta:
+    ele é pago por qualquer página. Com --baseline a mesma medição é feita na
+    revisão indicada (extraída com git archive em um diretório temporário) e
+    o relatório mostra antes e depois.
+'''
+
+import argparse
+import glob
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MARKER = '--curry-page--'
+
+# Roda a página depois de importar o streamlit e marcar o ponto de início
+RUNNER = ('import sys, runpy, streamlit; sys.stderr.write({marker!r} + "\\n"); sys.stderr.flush(); '
+          'runpy.run_path({page!r}, run_name="__main__")')
+
+LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)')
+
+
+def default_pages(root=ROOT):
+    return ['Home.py'] + sorted(os.path.relpath(path, root) for path in glob.glob(os.path.join(root, 'pages', '*.py')))
+
+
+def page_imports(page, root=ROOT):
+    
+    '''
+        Esta função roda a página em um processo novo e retorna o tempo
+        acumulado (em ms) de cada módulo importado no nível superior depois do
+        streamlit.
+        
+        Input: Caminho da página relativo a root
+        Output: Dicionário módulo -> ms
+    '''
+    
+    comando = [sys.executable, '-X', 'importtime', '-c', RUNNER.format(marker=MARKER, page=page)]
+    env = dict(os.environ, PYTHONPATH=root)
+    saida = subprocess.run(comando, cwd=root, env=env, capture_output=True, text=True)
+    if saida.returncode != 0:
+        raise RuntimeError('{} falhou:\n{}'.format(page, saida.stderr[-2000:]))
+    
+    linhas = saida.stderr.splitlines()
+    linhas = linhas[linhas.index(MARKER) + 1:]
+    
+    modulos = {}
+    for linha in linhas:
+        match = LINE.match(linha)
+        if match and not match.group(3).replace(' ', '', 1):
+            modulos[match.group(4)] = modulos.get(match.group(4), 0) + int(match.group(2)) / 1000
+    return modulos
+
+
+def measure(pages, repeat, root=ROOT):
+    
+    '''
+        Esta função mede as páginas repeat vezes e retorna, por página, o total
+        mediano e os módulos da execução mediana.
+    '''
+    
+    resultado = {}
+    for page in pages:
+        execucoes = sorted((page_imports(page, root) for _ in range(repeat)), key=lambda m: sum(m.values()))
+        mediana = execucoes[len(execucoes) // 2]
+        resultado[page] = {'total_ms': statistics.median(sum(m.values()) for m in execucoes), 'modules': mediana}
+    return resultado
+
+
+def checkout(revisao):
+    
+    '''
+        Esta função extrai a revisão em um diretório temporário (com o dataset
+        local ligado por symlink) e retorna o caminho.
+    '''
+    
+    destino = tempfile.mkdtemp(prefix='curry_import_')
+    archive = subprocess.run(['git', 'archive', revisao], cwd=ROOT, capture_output=True, check=True)
+    subprocess.run(['tar', '-x', '-C', destino], input=archive.stdout, check=True)
+    dataset = os.path.join(ROOT, 'dataset')
+    if os.path.isdir(dataset) and not os.path.exists(os.path.join(destino, 'dataset')):
+        os.symlink(dataset, os.path.join(destino, 'dataset'))
+    return destino
+
+
+def report(atual, top, anterior=None):
+    for page, medida in atual.items():
+        if anterior and page in anterior:
+            print('{:<34} {:>8.0f} ms  (antes {:.0f} ms)'.format(page, medida['total_ms'], anterior[page]['total_ms']))
+        else:
+            print('{:<34} {:>8.0f} ms'.format(page, medida['total_ms']))
+        modulos = sorted(medida['modules'].items(), key=lambda item: -item[1])[:top]
+        for modulo, ms in modulos:
+            print('    {:<30} {:>8.1f} ms'.format(modulo, ms))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.import_time', description='Tempo de importação das páginas.')
+    parser.add_argument('--pages', help='páginas separadas por vírgula (padrão: Home.py e pages/*.py)')
+    parser.add_argument('--repeat', type=int, default=3, help='execuções por página (vale a mediana)')
+    parser.add_argument('--top', type=int, default=8, help='módulos listados por página')
+    parser.add_argument('--baseline', help='revisão do git para comparar (ex.: HEAD~1)')
+    args = parser.parse_args(argv)
+    
+    pages = args.pages.split(',') if args.pages else default_pages()
+    
+    anterior = None
+    if args.baseline:
+        destino = checkout(args.baseline)
+        try:
+            anterior = measure([page for page in pages if os.path.exists(os.path.join(destino, page))], args.repeat, destino)
+        finally:
+            shutil.rmtree(destino, ignore_errors=True)
+    
+    report(measure(pages, args.repeat), args.top, anterior)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#================================================================================
+#==========        Precisão dos sketches de quantis
+#================================================================================
+
+'''
+    Confere os percentis do tempo de entrega estimados pelos sketches DDSketch
+    contra os quantis exatos (quantile com interpolation='lower') em várias
+    combinações de filtros e agrupamentos, e mede o tempo de cada caminho.
+
+    Uso:
+        python -m benchmarks.quantile_accuracy
+        CURRY_DATASET=benchmarks/data/orders_1M.csv python -m benchmarks.quantile_accuracy
+
+    Termina com erro se algum percentil estimado se afastar do exato mais que
+    o erro relativo garantido pelo sketch (RELATIVE_ACCURACY). A mesma
+    conferência roda nos testes (tests/test_sketches.py) com o dataset padrão.
+'''
+
+import argparse
+import datetime
+import itertools
+import sys
+import time
+
+import numpy as np
+
+from curry import kpis
+from curry.data import load_data
+from curry.sketches import RELATIVE_ACCURACY, TimeSketches, quantile_labels
+
+
+GROUPINGS = [[], ['City'], ['City', 'Road_traffic_density'], ['Road_traffic_density', 'Weatherconditions']]
+
+DATES = [None, datetime.datetime(2022, 3, 1), datetime.datetime(2022, 3, 31)]
+TRAFFIC = [None, ['Low'], ['Low', 'Jam'], ['Medium', 'High']]
+WEATHER = [None, ['conditions Sunny'], ['conditions Cloudy', 'conditions Fog', 'conditions Stormy']]
+
+
+def compare(sketches, by, filtros):
+    
+    '''
+        Esta função retorna o maior erro relativo entre os percentis estimados
+        e os exatos para o agrupamento e os filtros, e os tempos de cada
+        caminho.
+    '''
+    
+    inicio = time.perf_counter()
+    estimado = sketches.quantiles(by, **filtros)
+    t_sketch = time.perf_counter() - inicio
+    
+    inicio = time.perf_counter()
+    exato = kpis.delivery_time_percentiles(by, **filtros, exact=True)
+    t_exato = time.perf_counter() - inicio
+    
+    assert estimado[by + ['orders']].astype(str).equals(exato[by + ['orders']].astype(str)), 'grupos diferentes'
+    
+    colunas = quantile_labels()
+    a, b = estimado[colunas].to_numpy(dtype='float64'), exato[colunas].to_numpy(dtype='float64')
+    validos = ~np.isnan(b)
+    erro = np.abs(a[validos] - b[validos]) / b[validos]
+    return (erro.max() if len(erro) else 0.0), t_sketch, t_exato
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.quantile_accuracy',
+                                     description='Precisão e tempo dos sketches de quantis do tempo de entrega '
+                                                 '(dataset de CURRY_DATASET).')
+    parser.parse_args(argv)
+    
+    df1 = load_data()
+    inicio = time.perf_counter()
+    sketches = TimeSketches(df1)
+    t_build = time.perf_counter() - inicio
+    
+    print('linhas: {}  células: {}  baldes: {}  construção: {:.3f}s  {:.1f} MiB'.format(
+        len(df1), len(sketches.cells), sketches.counts.shape[1], t_build, sketches.counts.nbytes / 2 ** 20))
+    
+    pior, tempos_sketch, tempos_exato = 0.0, [], []
+    for by, date_max, traffic, weather in itertools.product(GROUPINGS, DATES, TRAFFIC, WEATHER):
+        filtros = dict(date_max=date_max, traffic=traffic, weather=weather)
+        erro, t_sketch, t_exato = compare(sketches, by, filtros)
+        pior = max(pior, erro)
+        tempos_sketch.append(t_sketch)
+        tempos_exato.append(t_exato)
+    
+    print('combinações: {}  maior erro relativo: {:.4%} (limite {:.2%})'.format(len(tempos_sketch), pior, RELATIVE_ACCURACY))
+    print('mediana por consulta: sketch {:.2f} ms  exato {:.2f} ms'.format(
+        np.median(tempos_sketch) * 1000, np.median(tempos_exato) * 1000))
+    
+    if pior > RELATIVE_ACCURACY + 1e-9:
+        sys.exit('erro relativo acima do limite do sketch')
+
+
+if __name__ == '__main__':
+    main()
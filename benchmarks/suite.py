@@ -0,0 +1,258 @@
+#================================================================================
+#==========        Suíte de benchmarks
+#================================================================================
+
+'''
+    Mede tempo de parede e pico de memória das funções do painel sobre dados
+    sintéticos em várias escalas e grava o resultado em JSON, para comparar
+    execuções e dimensionar os servidores.
+
+    Uso:
+        python -m benchmarks.suite [--scales 45k,1M,10M] [--output arquivo.json]
+
+    Os CSVs sintéticos ficam em benchmarks/data/ e são gerados na primeira
+    execução de cada escala; cada escala é medida em um processo separado.
+    Os KPIs medidos são as funções de curry.kpis, as mesmas das páginas e da
+    API. O tempo é o melhor de --repeat execuções sem
+    rastreamento; o pico de memória vem de uma execução separada com
+    tracemalloc (que inclui as alocações do NumPy).
+'''
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generate import SCALES, write_orders_csv
+
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+# Filtros usados nas medições (valores padrão das páginas, período quase todo)
+DATE_MAX = datetime.datetime(2022, 3, 31)
+TRAFFIC = ['Low', 'Jam']
+WEATHER = ['conditions Cloudy', 'conditions Sunny', 'conditions Fog']
+FILTERS = dict(date_max=DATE_MAX, traffic=TRAFFIC, weather=WEATHER)
+
+
+def dataset_for(escala):
+    
+    '''
+        Esta função retorna o CSV sintético da escala, gerando-o se preciso.
+    '''
+    
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, 'orders_{}.csv'.format(escala))
+    if not os.path.exists(path):
+        print('gerando {} ...'.format(path), flush=True)
+        write_orders_csv(path, SCALES[escala])
+    return path
+
+
+def measure(func, repeat=1, memory=True):
+    
+    '''
+        Esta função retorna (resultado, melhor tempo em s, pico de memória em
+        bytes ou None).
+    '''
+    
+    melhor = None
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        result = func()
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    
+    pico = None
+    if memory:
+        tracemalloc.start()
+        func()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    
+    return result, melhor, pico
+
+
+def benchmarks(path):
+    
+    '''
+        Esta função define as medições de uma escala, na ordem em que rodam.
+        Cada item é (nome, função); as estruturas construídas ficam em ctx
+        para as medições seguintes.
+        
+        Os KPIs são os de curry.kpis (os mesmos das páginas e da API),
+        chamados sem o cache de resultados; as variantes '_rows' e '_masks'
+        são as implementações sobre as linhas que eles substituíram. O
+        processo deve rodar com CURRY_DATASET apontando para path.
+    '''
+    
+    from curry import kpis
+    from curry.cube import PrefixCube, build_cube, load_cube, load_prefix
+    from curry.data import (clean_code, dataset_version, haversine_distance, join_calendar, load_calendar, load_data,
+                            prepare_data, read_orders, read_shared, shared_path, write_shared)
+    from curry.index import BitmapIndex, load_index
+    from curry.sketches import CourierSketches, TimeSketches, load_sketches, load_time_sketches
+    
+    ctx = {}
+    
+    def warm_caches():
+        # Estruturas compartilhadas pelos KPIs (uma única vez por processo)
+        for loader in (load_data, load_calendar, load_index, load_cube, load_prefix, load_sketches, load_time_sketches):
+            loader()
+        ctx['filtered'] = kpis.filtered_orders(**FILTERS)
+    
+    def filter_pipeline_masks():
+        df1 = ctx['df1']
+        df1 = df1.loc[df1['Order_Date'] <= DATE_MAX, :]
+        df1 = df1.loc[df1['Road_traffic_density'].isin(TRAFFIC), :]
+        return df1.loc[df1['Weatherconditions'].isin(WEATHER), :]
+    
+    def distance():
+        df1 = ctx['df1']
+        return haversine_distance(df1['Restaurant_latitude'], df1['Restaurant_longitude'],
+                                  df1['Delivery_location_latitude'], df1['Delivery_location_longitude'])
+    
+    def top_delivers_rows():
+        df2 = (ctx['filtered'].loc[:, ['Delivery_person_ID', 'City', 'Time_taken(min)']]
+                   .groupby(['City', 'Delivery_person_ID'], observed=True)
+                   .mean()
+                   .reset_index())
+        return df2.sort_values(['City', 'Time_taken(min)']).groupby('City', observed=True).head(10)
+    
+    def week_groupby_text():
+        df1 = ctx['filtered']
+        return df1.groupby(df1['Order_Date'].dt.strftime('%U'))['Delivery_person_ID'].nunique()
+    
+    def week_groupby_calendar():
+        df1 = ctx['filtered']
+        return df1.groupby(join_calendar(load_calendar(), df1['date_key'], 'year_week'))['Delivery_person_ID'].nunique()
+    
+    def avg_std_time_delivery_rows():
+        return ctx['filtered'].groupby('Festival', observed=True)['Time_taken(min)'].agg(['mean', 'std'])
+    
+    medicoes = [
+        ('read_orders', lambda: ctx.__setitem__('raw', read_orders(path))),
+        ('clean_code', lambda: clean_code(ctx['raw'])),
+        ('prepare_data', lambda: ctx.__setitem__('df1', prepare_data(ctx['raw']))),
+        ('distance', distance),
+        ('write_shared', lambda: write_shared(ctx['df1'], shared_path(path), dataset_version(path))),
+        ('read_shared', lambda: read_shared(shared_path(path))),
+        ('build_cube', lambda: ctx.__setitem__('cube', build_cube(ctx['df1']))),
+        ('build_prefix', lambda: PrefixCube(ctx['cube'])),
+        ('build_index', lambda: BitmapIndex(ctx['df1'])),
+        ('build_sketches', lambda: CourierSketches(ctx['df1'])),
+        ('build_time_sketches', lambda: TimeSketches(ctx['df1'])),
+        ('warm_caches', warm_caches),
+        ('filter_pipeline', lambda: kpis.filtered_orders(**FILTERS)),
+        ('filter_pipeline_masks', filter_pipeline_masks),
+        ('top_delivers_rows', top_delivers_rows),
+        ('week_groupby_text', week_groupby_text),
+        ('week_groupby_calendar', week_groupby_calendar),
+        ('avg_std_time_delivery_rows', avg_std_time_delivery_rows),
+    ]
+    
+    # Todos os KPIs das páginas, com os parâmetros padrão
+    for nome, (func, _) in kpis.KPIS.items():
+        medicoes.append(('kpi.' + nome, lambda func=func: func(**FILTERS)))
+    medicoes.append(('kpi.order_share_by_week.exact', lambda: kpis.order_share_by_week(**FILTERS, exact=True)))
+    medicoes.append(('kpi.unique_couriers.exact', lambda: kpis.unique_couriers(**FILTERS, exact=True)))
+    medicoes.append(('kpi.delivery_time_percentiles_by_city_traffic.exact',
+                     lambda: kpis.delivery_time_percentiles_by_city_traffic(**FILTERS, exact=True)))
+    
+    return ctx, medicoes
+
+
+def run_scale(escala, repeat=1, memory=True):
+    
+    '''
+        Esta função executa as medições de uma escala neste processo.
+        
+        Output: Lista de resultados
+    '''
+    
+    path = os.environ['CURRY_DATASET']
+    ctx, medicoes = benchmarks(path)
+    
+    resultados = []
+    for nome, func in medicoes:
+        _, segundos, pico = measure(func, repeat=repeat, memory=memory)
+        linhas = len(ctx['df1']) if 'df1' in ctx else None
+        resultados.append({'scale': escala, 'rows': SCALES[escala], 'clean_rows': linhas,
+                           'benchmark': nome, 'seconds': segundos, 'peak_bytes': pico})
+        print('{:>4} {:<36} {:>9.4f}s {:>10}'.format(
+            escala, nome, segundos, '' if pico is None else '{:.1f} MiB'.format(pico / 2 ** 20)), flush=True)
+    
+    return resultados
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description='Suíte de benchmarks do painel.')
+    parser.add_argument('--scales', default='45k,1M,10M', help='escalas separadas por vírgula ({})'.format(', '.join(SCALES)))
+    parser.add_argument('--repeat', type=int, default=1, help='execuções por medição (vale o melhor tempo)')
+    parser.add_argument('--no-memory', action='store_true', help='não mede o pico de memória')
+    parser.add_argument('--output', help='arquivo JSON de saída (padrão: benchmarks/results/<data>.json)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    
+    if args.worker:
+        with open(args.output, 'w') as f:
+            json.dump(run_scale(args.worker, args.repeat, not args.no_memory), f)
+        return
+    
+    resultado = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': [],
+    }
+    
+    # Cada escala roda em um processo novo, com CURRY_DATASET apontando para o
+    # CSV sintético: os caches do dataset (curry.data) e a memória não se
+    # misturam entre escalas
+    for escala in args.scales.split(','):
+        path = dataset_for(escala)
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+            parcial = f.name
+        comando = [sys.executable, '-m', 'benchmarks.suite', '--worker', escala, '--output', parcial,
+                   '--repeat', str(args.repeat)] + (['--no-memory'] if args.no_memory else [])
+        try:
+            subprocess.run(comando, env=dict(os.environ, CURRY_DATASET=path), check=True)
+            with open(parcial) as f:
+                resultado['results'].extend(json.load(f))
+        finally:
+            os.remove(parcial)
+    
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, '{}.json'.format(datetime.datetime.now().strftime('%Y%m%d-%H%M%S')))
+    with open(output, 'w') as f:
+        json.dump(resultado, f, indent=2)
+    print('resultados gravados em {}'.format(output))
+
+
+if __name__ == '__main__':
+    main()
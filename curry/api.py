@@ -0,0 +1,264 @@
+#================================================================================
+#==========        API HTTP dos KPIs
+#================================================================================
+
+'''
+    API HTTP somente leitura com os KPIs do painel em JSON.
+    
+    Uso:
+        python -m curry.api [--host 127.0.0.1] [--port 8601]
+    
+    Ou no mesmo processo do Streamlit, compartilhando o dataset e os caches
+    já carregados pelas páginas: CURRY_API_PORT=8601 streamlit run Home.py
+    
+    Rotas:
+        GET /health          estado e versão do dataset
+        GET /kpis            KPIs disponíveis e seus parâmetros extras
+        GET /kpis/<nome>     resultado do KPI
+    
+    Filtros (os mesmos da barra lateral; ausentes não filtram):
+        date_min, date_max   datas no formato AAAA-MM-DD
+        traffic, weather     valores separados por vírgula ou repetidos
+                             (traffic=Low,Jam ou traffic=Low&traffic=Jam)
+    
+    Exemplo:
+        curl 'localhost:8601/kpis/delivery_time_by_city?date_max=2022-03-15&traffic=Low,Jam'
+'''
+
+import argparse
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from curry.data import dataset_version, load_data
+from curry.figcache import SizedCache
+from curry.kpis import KPIS, compute, filter_key
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8601
+
+FILTER_PARAMS = ['date_min', 'date_max', 'traffic', 'weather']
+
+# Parâmetros extras inteiros e o menor e o maior valor aceitos (k segue o
+# slider da página de entregadores)
+MIN_PARAMS = {'k': 1, 'bins': 1}
+MAX_PARAMS = {'k': 50, 'bins': 200}
+
+# Respostas já serializadas, pela mesma chave do cache de KPIs
+response_cache = SizedCache(int(float(os.environ.get('CURRY_API_CACHE_MB', 16)) * 2 ** 20), len)
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def to_jsonable(value):
+    
+    '''
+        Esta função converte o resultado de um KPI em valores serializáveis em
+        JSON (dataframes viram listas de registros e NaN vira null).
+    '''
+    
+    if isinstance(value, pd.DataFrame):
+        return value.astype(object).where(value.notna(), None).to_dict(orient='records')
+    if isinstance(value, dict):
+        return {chave: to_jsonable(valor) for chave, valor in value.items()}
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def parse_list(valores):
+    
+    '''
+        Esta função junta os valores de um parâmetro repetido e/ou separado
+        por vírgulas.
+    '''
+    
+    return [item.strip() for valor in valores for item in valor.split(',') if item.strip()]
+
+
+def parse_bool(valor):
+    if valor.lower() in ('1', 'true', 'yes', 'sim'):
+        return True
+    if valor.lower() in ('0', 'false', 'no', 'nao', 'não', ''):
+        return False
+    raise ValueError('valor booleano inválido: {!r}'.format(valor))
+
+
+def parse_date(chave, valor):
+    data = pd.Timestamp(valor) if valor.strip() else pd.NaT
+    if pd.isna(data):
+        raise ValueError('data inválida em {}: {!r}'.format(chave, valor))
+    return data
+
+
+def parse_request(nome, query):
+    
+    '''
+        Esta função valida os parâmetros da URL para o KPI nome.
+        
+        Input: Nome do KPI e dicionário de parse_qs
+        Output: (filtros, parâmetros extras); ValueError se algum parâmetro for
+                inválido
+    '''
+    
+    _, extras = KPIS[nome]
+    desconhecidos = set(query) - set(FILTER_PARAMS) - set(extras)
+    if desconhecidos:
+        raise ValueError('parâmetros desconhecidos: {}'.format(', '.join(sorted(desconhecidos))))
+    
+    filtros = {}
+    for chave in ('date_min', 'date_max'):
+        if chave in query:
+            filtros[chave] = parse_date(chave, query[chave][-1])
+    for chave in ('traffic', 'weather'):
+        if chave in query:
+            filtros[chave] = parse_list(query[chave])
+    
+    params = {}
+    for chave, tipo in extras.items():
+        if chave in query:
+            params[chave] = parse_bool(query[chave][-1]) if tipo is bool else tipo(query[chave][-1])
+            if chave in MIN_PARAMS and params[chave] < MIN_PARAMS[chave]:
+                raise ValueError('{} deve ser pelo menos {}: {}'.format(chave, MIN_PARAMS[chave], params[chave]))
+            if chave in MAX_PARAMS and params[chave] > MAX_PARAMS[chave]:
+                raise ValueError('{} deve ser no máximo {}: {}'.format(chave, MAX_PARAMS[chave], params[chave]))
+    
+    return filtros, params
+
+
+def kpi_response(nome, filtros, params):
+    
+    '''
+        Esta função retorna o corpo JSON (bytes) da resposta do KPI.
+    '''
+    
+    versao = dataset_version()
+    key = (nome, versao, filter_key(**filtros), tuple(sorted(params.items())))
+    
+    def build():
+        payload = {
+            'kpi': nome,
+            'dataset_version': versao,
+            'filters': {chave: filtros.get(chave) for chave in FILTER_PARAMS},
+            'params': params,
+            'data': to_jsonable(compute(nome, **filtros, **params)),
+        }
+        return json.dumps(payload, default=json_default).encode()
+    
+    return response_cache.get_or_build(key, build)
+
+
+class KPIHandler(BaseHTTPRequestHandler):
+    
+    server_version = 'CurryKPI/1.0'
+    
+    def send_json(self, status, body):
+        if not isinstance(body, bytes):
+            body = json.dumps(body, default=json_default).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        url = urlsplit(self.path)
+        partes = [parte for parte in url.path.split('/') if parte]
+        
+        if partes == ['health']:
+            return self.send_json(200, {'status': 'ok', 'dataset_version': dataset_version()})
+        
+        if partes == ['kpis']:
+            return self.send_json(200, {nome: {'params': FILTER_PARAMS + list(extras)}
+                                        for nome, (_, extras) in KPIS.items()})
+        
+        if len(partes) == 2 and partes[0] == 'kpis':
+            nome = partes[1]
+            if nome not in KPIS:
+                return self.send_json(404, {'error': 'KPI desconhecido: {}'.format(nome)})
+            try:
+                filtros, params = parse_request(nome, parse_qs(url.query, keep_blank_values=True))
+            except ValueError as erro:
+                return self.send_json(400, {'error': str(erro)})
+            try:
+                body = kpi_response(nome, filtros, params)
+            except Exception as erro:
+                # Qualquer falha no cálculo vira uma resposta JSON, nunca uma conexão sem resposta
+                return self.send_json(500, {'error': '{}: {}'.format(type(erro).__name__, erro)})
+            return self.send_json(200, body)
+        
+        return self.send_json(404, {'error': 'rota desconhecida: {}'.format(url.path)})
+    
+    def log_message(self, format, *args):
+        # Sem log por requisição: com milhares de requisições por minuto ele
+        # custa mais que a própria resposta em cache
+        pass
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    
+    '''
+        Esta função cria o servidor (uma thread por requisição) e carrega o
+        dataset antes de aceitar requisições.
+    '''
+    
+    load_data()
+    return ThreadingHTTPServer((host, port), KPIHandler)
+
+
+def serve_alongside_ui():
+    
+    '''
+        Esta função inicia a API em uma thread do processo do Streamlit quando
+        CURRY_API_PORT está definida, uma única vez por processo. As páginas e
+        a API passam a compartilhar o dataset e os caches em memória.
+    '''
+    
+    global _server
+    
+    port = os.environ.get('CURRY_API_PORT')
+    if not port or _server is not None:
+        return
+    
+    with _server_lock:
+        if _server is not None:
+            return
+        _server = make_server(os.environ.get('CURRY_API_HOST', DEFAULT_HOST), int(port))
+        threading.Thread(target=_server.serve_forever, name='curry-api', daemon=True).start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m curry.api', description='API HTTP dos KPIs do painel.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+    
+    server = make_server(args.host, args.port)
+    print('API dos KPIs em http://{}:{}/kpis'.format(args.host, args.port), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
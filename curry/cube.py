@@ -0,0 +1,219 @@
+#================================================================================
+#==========        Cubo diário pré-agregado
+#================================================================================
+
+'''
+    Cubo OLAP diário dos pedidos.
+
+    Cada célula corresponde a uma combinação de DIMENSIONS e guarda a quantidade
+    de pedidos e, para cada medida, a contagem de valores válidos, a soma e a soma
+    dos quadrados. Qualquer combinação de filtros é respondida somando células,
+    e média e desvio padrão (amostral, como no pandas) são reconstruídos a partir
+    desses momentos. Para o tempo de entrega (inteiro) somas e somas de quadrados
+    são guardadas em int64, portanto exatas.
+'''
+
+import numpy as np
+
+from curry.data import DATASET_PATH, load_data, load_derived, widen
+from curry.profiling import profiled
+
+
+DIMENSIONS = ['Order_Date', 'City', 'Road_traffic_density', 'Weatherconditions', 'Festival', 'Type_of_order']
+
+# Nome da medida no cubo -> coluna do dataset
+MEASURES = {
+    'time': 'Time_taken(min)',
+    'distance': 'distance',
+    'rating': 'Delivery_person_Ratings',
+}
+
+
+def build_cube(df1):
+    
+    '''
+        Esta função tem a responsabilidade de agregar os pedidos nas células
+        do cubo.
+        
+        Input: Dataframe limpo
+        Output: Dataframe com as colunas de DIMENSIONS, 'count' e, para cada
+                medida m, 'm_n', 'm_sum' e 'm_sumsq'
+    '''
+    
+    df_aux = df1.loc[:, DIMENSIONS]
+    df_aux['count'] = 1
+    for nome, col in MEASURES.items():
+        # Somas sempre em 64 bits, mesmo com as colunas compactas (int8,
+        # int16, float32) do dataframe limpo
+        valores = widen(df1[col])
+        df_aux[nome + '_n'] = valores.notna().astype('int64')
+        df_aux[nome + '_sum'] = valores.fillna(0)
+        df_aux[nome + '_sumsq'] = valores.fillna(0) ** 2
+    
+    cube = df_aux.groupby(DIMENSIONS, sort=True, dropna=False, observed=True).sum().reset_index()
+    return cube
+
+
+def measure_columns(measures=tuple(MEASURES)):
+    
+    '''
+        Esta função retorna as colunas de momentos do cubo (inclui 'count').
+    '''
+    
+    cols = ['count']
+    for nome in measures:
+        cols += [nome + '_n', nome + '_sum', nome + '_sumsq']
+    return cols
+
+
+def load_cube(path=DATASET_PATH):
+    
+    '''
+        Esta função retorna o cubo do dataset, construído uma vez por processo.
+    '''
+    
+    return load_derived('cube', lambda p: build_cube(load_data(p)), path)
+
+
+@profiled
+def filter_cube(cube, date_max=None, traffic=None, weather=None, date_min=None):
+    
+    '''
+        Esta função aplica os filtros da barra lateral sobre as células do cubo.
+        Filtros com valor None não são aplicados.
+        
+        Input: Cubo, data limite, condições de trânsito, condições climáticas e
+               data inicial
+        Output: Cubo filtrado
+    '''
+    
+    linhas_selecionadas = np.ones(len(cube), dtype=bool)
+    if date_min is not None:
+        linhas_selecionadas &= (cube['Order_Date'] >= date_min).to_numpy()
+    if date_max is not None:
+        linhas_selecionadas &= (cube['Order_Date'] <= date_max).to_numpy()
+    if traffic is not None:
+        linhas_selecionadas &= cube['Road_traffic_density'].isin(traffic).to_numpy()
+    if weather is not None:
+        linhas_selecionadas &= cube['Weatherconditions'].isin(weather).to_numpy()
+    
+    return cube.loc[linhas_selecionadas, :]
+
+
+def moments(n, soma, soma_quadrados):
+    
+    '''
+        Esta função reconstrói média e desvio padrão amostral (ddof=1) a partir
+        da contagem, soma e soma dos quadrados. Grupos com n < 2 têm desvio NaN.
+    '''
+    
+    n = np.asarray(n, dtype='float64')
+    soma = np.asarray(soma, dtype='float64')
+    soma_quadrados = np.asarray(soma_quadrados, dtype='float64')
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        media = np.where(n > 0, soma / n, np.nan)
+        variancia = np.where(n > 1, (soma_quadrados - soma * media) / (n - 1), np.nan)
+    
+    # Erros de arredondamento podem gerar variâncias negativas minúsculas
+    return media, np.sqrt(np.clip(variancia, 0, None))
+
+
+def rollup(cube, by, measures=()):
+    
+    '''
+        Esta função soma as células do cubo pelas dimensões em by e calcula
+        média e desvio padrão das medidas pedidas.
+        
+        Com by vazio o resultado tem uma única linha com o total geral.
+        
+        Input: Cubo (filtrado), lista de dimensões e lista de medidas
+        Output: Dataframe com as colunas de by, 'count' e, para cada medida m,
+                'm_mean' e 'm_std'
+    '''
+    
+    cols = measure_columns(measures)
+    
+    if not by:
+        df_aux = cube[cols].sum().to_frame().T.astype({'count': 'int64'})
+        by = None
+    else:
+        # No pandas 1.5 observed=True ignora sort=True em colunas categóricas
+        df_aux = cube.groupby(by, sort=True, observed=True)[cols].sum().sort_index()
+    
+    result = df_aux[['count']].copy()
+    for nome in measures:
+        media, desvio = moments(df_aux[nome + '_n'], df_aux[nome + '_sum'], df_aux[nome + '_sumsq'])
+        result[nome + '_mean'] = media
+        result[nome + '_std'] = desvio
+    
+    return result.reset_index(drop=by is None)
+
+
+class PrefixCube:
+    
+    '''
+        Somas acumuladas (prefixos) do cubo ao longo das datas.
+
+        Para cada grupo (combinação das dimensões exceto a data) guarda o total
+        acumulado de cada coluna de momentos até cada data. O total de qualquer
+        intervalo [início, fim] é a diferença entre dois prefixos, localizados
+        por busca binária, sem percorrer o histórico.
+    '''
+    
+    def __init__(self, cube):
+        dims = DIMENSIONS[1:]
+        self.columns = measure_columns()
+        
+        grupos = cube.groupby(dims, sort=True, dropna=False, observed=True)
+        g_idx = grupos.ngroup().to_numpy()
+        self.groups = grupos.size().reset_index()[dims]
+        
+        self.dates = np.sort(cube['Order_Date'].unique())
+        d_idx = np.searchsorted(self.dates, cube['Order_Date'].to_numpy())
+        
+        # Linha 0 é o prefixo vazio; cada célula do cubo é única por (data, grupo)
+        acc = np.zeros((len(self.dates) + 1, len(self.groups), len(self.columns)))
+        acc[d_idx + 1, g_idx] = cube[self.columns].to_numpy(dtype='float64')
+        self.acc = np.cumsum(acc, axis=0)
+    
+    @profiled(name='PrefixCube.totals')
+    def totals(self, date_min=None, date_max=None, traffic=None, weather=None):
+        
+        '''
+            Esta função retorna os totais de cada grupo no intervalo de datas,
+            já com os filtros de trânsito e clima aplicados sobre os grupos.
+            
+            Input: Data inicial, data limite, condições de trânsito e climáticas
+            Output: Dataframe com as dimensões (exceto data) e as colunas de
+                    momentos, no mesmo formato aceito por rollup
+        '''
+        
+        inicio = 0 if date_min is None else np.searchsorted(self.dates, np.datetime64(date_min), side='left')
+        fim = len(self.dates) if date_max is None else np.searchsorted(self.dates, np.datetime64(date_max), side='right')
+        fim = max(fim, inicio)
+        
+        grupos_selecionados = np.ones(len(self.groups), dtype=bool)
+        if traffic is not None:
+            grupos_selecionados &= self.groups['Road_traffic_density'].isin(traffic).to_numpy()
+        if weather is not None:
+            grupos_selecionados &= self.groups['Weatherconditions'].isin(weather).to_numpy()
+        
+        valores = self.acc[fim, grupos_selecionados] - self.acc[inicio, grupos_selecionados]
+        
+        df_aux = self.groups.loc[grupos_selecionados, :].reset_index(drop=True)
+        df_aux[self.columns] = valores
+        df_aux['count'] = df_aux['count'].round().astype('int64')
+        
+        # Grupos sem pedidos no intervalo não devem aparecer nos gráficos
+        return df_aux.loc[df_aux['count'] > 0, :]
+
+
+def load_prefix(path=DATASET_PATH):
+    
+    '''
+        Esta função retorna os prefixos acumulados do cubo, construídos uma vez
+        por processo.
+    '''
+    
+    return load_derived('prefix', lambda p: PrefixCube(load_cube(p)), path)
@@ -0,0 +1,805 @@
+#================================================================================
+#==========        Camada de dados
+#================================================================================
+
+import contextlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from curry.profiling import profiled, row_count, span
+from curry.readonly import check, freeze, guard
+
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+
+# Pode apontar para um CSV, para um Parquet gerado por curry.ingest ou
+# diretamente para o arquivo Arrow compartilhado (.arrow)
+DATASET_PATH = os.environ.get('CURRY_DATASET', 'dataset/train.csv')
+
+# Versão do esquema do snapshot; incrementar sempre que colunas derivadas mudarem
+SNAPSHOT_VERSION = '5'
+
+# Raio médio da Terra em km (mesmo valor usado pela biblioteca haversine)
+EARTH_RADIUS_KM = 6371.0088
+
+# Cache do processo: (estrutura, caminho absoluto) -> (assinatura do arquivo, valor)
+_cache = {}
+# Reentrante: builders de estruturas derivadas chamam load_data
+_lock = threading.RLock()
+
+
+# Marcadores de dado ausente usados no CSV original
+NA_VALUES = ['NaN ', 'NaN']
+
+# Tipos declarados já na leitura, evitando converter colunas de texto depois
+CSV_DTYPES = {
+    'Delivery_person_Age': 'float64',
+    'Delivery_person_Ratings': 'float64',
+    'Restaurant_latitude': 'float64',
+    'Restaurant_longitude': 'float64',
+    'Delivery_location_latitude': 'float64',
+    'Delivery_location_longitude': 'float64',
+    'Vehicle_condition': 'int64',
+    'multiple_deliveries': 'float64',
+    # Colunas de baixa cardinalidade: cada valor distinto é lido uma vez só
+    'Delivery_person_ID': 'category',
+    'Order_Date': 'category',
+    'Time_Orderd': 'category',
+    'Time_Order_picked': 'category',
+    'Weatherconditions': 'category',
+    'Road_traffic_density': 'category',
+    'Type_of_order': 'category',
+    'Type_of_vehicle': 'category',
+    'Festival': 'category',
+    'City': 'category',
+    'Time_taken(min)': 'category',
+}
+
+# Linhas com dado ausente em qualquer uma destas colunas são descartadas
+REQUIRED_COLUMNS = ['Delivery_person_Age', 'Road_traffic_density', 'multiple_deliveries', 'City', 'Festival']
+
+# Colunas categóricas que chegam com espaço no final (ID é tratado à parte)
+STRIP_COLUMNS = ['Delivery_person_ID', 'Type_of_order', 'Type_of_vehicle', 'Road_traffic_density', 'Festival']
+
+# Layout compacto do dataframe limpo: colunas de texto de baixa cardinalidade
+# ficam categóricas (códigos inteiros + tabela de categorias) e as numéricas
+# usam o menor tipo que comporta os valores do domínio. As coordenadas só viram
+# float32 depois do cálculo da distância, feito em float64.
+CATEGORY_COLUMNS = ['Delivery_person_ID', 'Time_Orderd', 'Time_Order_picked', 'Weatherconditions',
+                    'Road_traffic_density', 'Type_of_order', 'Type_of_vehicle', 'Festival', 'City']
+
+COMPACT_DTYPES = {
+    'Delivery_person_Age': 'int8',
+    'Delivery_person_Ratings': 'float32',
+    'Restaurant_latitude': 'float32',
+    'Restaurant_longitude': 'float32',
+    'Delivery_location_latitude': 'float32',
+    'Delivery_location_longitude': 'float32',
+    'Vehicle_condition': 'int8',
+    'multiple_deliveries': 'int8',
+    'Time_taken(min)': 'int16',
+    'distance': 'float32',
+    'date_key': 'int32',
+}
+
+# Tipos da dimensão calendário (calendar_table)
+CALENDAR_DTYPES = {'year_week': 'int32', 'iso_week': 'int32', 'day_of_week': 'int8', 'month': 'int8'}
+
+# O ID do pedido é único por linha: no dataframe fica o código inteiro (int32)
+# e o texto original fica em uma única tabela Arrow em df1.attrs[ORDER_IDS]
+ORDER_IDS = 'order_ids'
+
+
+def decode_category(col, func=None):
+    
+    '''
+        Esta função converte uma coluna categórica de volta para valores comuns,
+        aplicando func apenas sobre as categorias distintas (ex.: strip, slice,
+        conversão de data) em vez de linha a linha.
+    '''
+    
+    categorias = col.cat.categories
+    if func is not None:
+        categorias = pd.Index(func(categorias))
+    
+    codes = col.cat.codes.to_numpy()
+    if (codes < 0).any():
+        # Código -1 indica dado ausente
+        if categorias.dtype.kind in 'iu':
+            categorias = categorias.astype('float64')
+        return categorias.take(codes, allow_fill=True, fill_value=np.nan).to_numpy()
+    
+    return categorias.take(codes).to_numpy()
+
+
+def recode_category(col, func):
+    
+    '''
+        Esta função aplica func sobre as categorias de uma coluna categórica e
+        mantém o resultado categórico, juntando as categorias que passam a ser
+        iguais (ex.: 'Low' e 'Low ' depois do strip).
+    '''
+    
+    categorias = pd.Index(func(col.cat.categories))
+    novas = categorias.unique().sort_values()
+    
+    codes = col.cat.codes.to_numpy()
+    codes = np.where(codes < 0, -1, novas.get_indexer(categorias)[codes])
+    return pd.Categorical.from_codes(codes, categories=novas)
+
+
+def encode_ids(valores):
+    
+    '''
+        Esta função troca uma coluna de identificadores de texto por códigos
+        inteiros e uma tabela de consulta Arrow (texto contíguo, sem um objeto
+        Python por linha).
+        
+        Input: Valores de texto (Series, array ou array Arrow)
+        Output: (códigos int32, pa.StringArray com o texto de cada código)
+    '''
+    
+    if not isinstance(valores, (pa.Array, pa.ChunkedArray)):
+        valores = pa.array(np.asarray(valores, dtype=object), type=pa.string())
+    dicionario = pa.chunked_array([valores]) if isinstance(valores, pa.Array) else valores
+    dicionario = dicionario.dictionary_encode().combine_chunks()
+    return dicionario.indices.to_numpy(zero_copy_only=False).astype('int32'), dicionario.dictionary
+
+
+def order_ids(df1, codes=None):
+    
+    '''
+        Esta função retorna o texto original do ID dos pedidos (todos, ou
+        apenas os dos códigos informados).
+    '''
+    
+    codes = df1['ID'].to_numpy() if codes is None else np.asarray(codes)
+    return df1.attrs[ORDER_IDS].take(pa.array(codes)).to_numpy(zero_copy_only=False)
+
+
+@profiled
+def read_orders(path, chunksize=None):
+    
+    '''
+        Esta função lê o CSV de pedidos já com os marcadores de dado ausente
+        e os tipos numéricos declarados.
+        
+        Input: Caminho do arquivo CSV (ou buffer) e, opcionalmente, o número
+               de linhas por bloco
+        Output: Dataframe bruto (ou iterador de blocos quando chunksize é dado)
+    '''
+    
+    return pd.read_csv(path, na_values=NA_VALUES, keep_default_na=False, dtype=CSV_DTYPES, chunksize=chunksize)
+
+
+@profiled
+def clean_code(df1):
+    
+    ''' 
+        Esta função tem a responsabilidade de limpar o dataframe lido por
+        read_orders
+
+        Tipos de Limpeza:
+        1. Remoção dos dados NaN (uma única máscara aplicada uma única vez)
+        2. Mudança do tipo da coluna de dados
+        3. Remoção dos espaços das variáveis de texto
+        4. Formatação da coluna de data
+        5. Limpeza da coluna de tempo (Remoção do texto da variável numérica)
+        
+        Input: Dataframe
+        Output: Dataframe
+    '''
+    
+    linhas_selecionadas = df1[REQUIRED_COLUMNS].notna().all(axis=1)
+    df1 = df1.loc[linhas_selecionadas, :].reset_index(drop=True)
+    
+    df1['Order_Date'] = decode_category(df1['Order_Date'], lambda c: pd.to_datetime(c, format='%d-%m-%Y'))
+    df1['Time_taken(min)'] = decode_category(df1['Time_taken(min)'], lambda c: c.str.slice(6).astype('int64'))
+
+    # Removendo espaços do campo
+    df1['ID'] = df1['ID'].str.strip()
+    for col in STRIP_COLUMNS:
+        df1[col] = recode_category(df1[col], lambda c: c.str.strip())
+    
+    return df1
+
+
+def compact_frame(df1):
+    
+    '''
+        Esta função converte o dataframe limpo (com as colunas derivadas já
+        calculadas) para o layout compacto mantido em memória: categorias para
+        as colunas de texto, tipos numéricos reduzidos e o ID como código
+        inteiro com a tabela de consulta em df1.attrs[ORDER_IDS].
+        
+        Input: Dataframe limpo
+        Output: Dataframe compacto
+    '''
+    
+    for col in CATEGORY_COLUMNS:
+        if not isinstance(df1[col].dtype, pd.CategoricalDtype):
+            df1[col] = df1[col].astype('category')
+    
+    df1 = df1.astype(COMPACT_DTYPES)
+    
+    codes, lookup = encode_ids(df1['ID'])
+    df1['ID'] = codes
+    df1.attrs[ORDER_IDS] = lookup
+    return df1
+
+
+def widen(valores):
+    
+    '''
+        Esta função converte uma coluna numérica compacta para 64 bits antes
+        de somas, médias e desvios: inteiros viram int64 e reais float64.
+
+        Os float32 são arredondados para 6 algarismos significativos (o que o
+        float32 preserva), recuperando o valor decimal lido do CSV: 3.9 e não
+        3.9000000953674316.
+        
+        Input: Série numérica
+        Output: Série int64 ou float64
+    '''
+    
+    if valores.dtype.kind in 'iu':
+        return valores.astype('int64')
+    if valores.dtype != 'float32':
+        return valores.astype('float64')
+    
+    valores = valores.astype('float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expoente = np.floor(np.log10(np.abs(valores.to_numpy())))
+    escala = 10.0 ** (5 - np.where(np.isfinite(expoente), expoente, 0))
+    return (valores * escala).round() / escala
+
+
+def expand_frame(df1):
+    
+    '''
+        Esta função retorna o dataframe no layout anterior ao compacto (texto
+        em object, inteiros int64 e reais float64), usado apenas no relatório
+        de memória.
+    '''
+    
+    df_aux = df1.copy()
+    df_aux['ID'] = order_ids(df1)
+    for col in CATEGORY_COLUMNS:
+        df_aux[col] = decode_category(df1[col])
+    for col, dtype in COMPACT_DTYPES.items():
+        df_aux[col] = df1[col].astype('int64' if dtype.startswith('int') else 'float64')
+    df_aux.attrs = {}
+    return df_aux
+
+
+def column_bytes(df1):
+    
+    '''
+        Esta função retorna os bytes ocupados por cada coluna (incluindo os
+        textos e a tabela de consulta do ID).
+    '''
+    
+    tamanhos = df1.memory_usage(index=False, deep=True)
+    if ORDER_IDS in df1.attrs:
+        tamanhos['ID'] += df1.attrs[ORDER_IDS].nbytes
+    return tamanhos
+
+
+def memory_report(df1):
+    
+    '''
+        Esta função compara, coluna a coluna, os bytes do dataframe compacto
+        com os do layout anterior.
+        
+        Input: Dataframe compacto (load_data)
+        Output: Dataframe com tipo e bytes antes e depois, e a linha 'total'
+    '''
+    
+    antes = expand_frame(df1)
+    df_aux = pd.DataFrame({'dtype_before': antes.dtypes.astype(str),
+                           'bytes_before': column_bytes(antes),
+                           'dtype_after': df1.dtypes.astype(str),
+                           'bytes_after': column_bytes(df1)})
+    df_aux.loc['total'] = ['', df_aux['bytes_before'].sum(), '', df_aux['bytes_after'].sum()]
+    df_aux['ratio'] = (df_aux['bytes_after'] / df_aux['bytes_before']).round(3)
+    return df_aux
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    
+    '''
+        Esta função calcula a distância em km pelo grande círculo (fórmula de
+        haversine) de forma vetorizada sobre arrays NumPy.
+    '''
+    
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype='float64')) for x in (lat1, lon1, lat2, lon2))
+    
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def date_keys(datas):
+    
+    '''
+        Esta função retorna a chave inteira (AAAAMMDD, int32) de cada data,
+        calculada uma vez por data distinta e espalhada pelas linhas.
+        
+        Input: Série ou DatetimeIndex de datas (sem dado ausente)
+        Output: Array int32
+    '''
+    
+    codes, unicas = pd.factorize(datas, sort=True)
+    unicas = pd.DatetimeIndex(unicas)
+    chaves = (unicas.year * 10000 + unicas.month * 100 + unicas.day).to_numpy(dtype='int32')
+    return chaves[codes]
+
+
+def calendar_table(datas):
+    
+    '''
+        Esta função monta a dimensão calendário: uma linha por data distinta,
+        indexada pela chave inteira da data (date_key) e em ordem.
+        
+        Colunas:
+        1. Order_Date: a data
+        2. year_week: ano * 100 + semana do ano (domingo como primeiro dia,
+           '%U'); ordena corretamente entre anos diferentes
+        3. iso_week: ano ISO * 100 + semana ISO
+        4. day_of_week: dia da semana (0 = segunda-feira)
+        5. month: mês
+        
+        Input: Série de datas
+        Output: Dataframe indexado por date_key
+    '''
+    
+    unicas = pd.DatetimeIndex(pd.unique(pd.Series(datas).dropna())).sort_values()
+    iso = unicas.isocalendar()
+    semanas = unicas.strftime('%U').astype('int32')
+    
+    calendario = pd.DataFrame({
+        'Order_Date': unicas,
+        'year_week': unicas.year * 100 + semanas,
+        'iso_week': iso['year'].to_numpy() * 100 + iso['week'].to_numpy(),
+        'day_of_week': unicas.dayofweek,
+        'month': unicas.month,
+    }, index=pd.Index(date_keys(unicas), name='date_key'))
+    return calendario.astype(CALENDAR_DTYPES)
+
+
+def join_calendar(calendario, chaves, col):
+    
+    '''
+        Esta função junta a coluna col da dimensão calendário às chaves de
+        data (busca binária no índice ordenado, sem hash por linha).
+        
+        Input: Dimensão calendário, chaves date_key e nome da coluna
+        Output: Array com o valor de col para cada chave
+    '''
+    
+    posicoes = np.searchsorted(calendario.index.to_numpy(), np.asarray(chaves))
+    return calendario[col].to_numpy()[posicoes]
+
+
+def prepare_data(df):
+    
+    '''
+        Esta função executa a preparação completa do dataset: limpeza,
+        cálculo das colunas derivadas que as páginas apenas agregam e
+        conversão para o layout compacto.
+        
+        Colunas derivadas:
+        1. distance: distância em km entre restaurante e local de entrega
+        2. date_key: data do pedido como inteiro AAAAMMDD, chave da dimensão
+           calendário (load_calendar)
+        
+        Input: Dataframe lido por read_orders
+        Output: Dataframe compacto
+    '''
+    
+    df1 = clean_code(df)
+    
+    with span('distance', rows_in=len(df1)):
+        df1['distance'] = haversine_distance(df1['Restaurant_latitude'], df1['Restaurant_longitude'],
+                                             df1['Delivery_location_latitude'], df1['Delivery_location_longitude'])
+    
+    with span('date_key', rows_in=len(df1)):
+        df1['date_key'] = date_keys(df1['Order_Date'])
+    
+    with span('compact', rows_in=len(df1)):
+        df1 = compact_frame(df1)
+    
+    return df1
+
+
+def file_signature(path):
+    
+    '''
+        Esta função retorna a assinatura do arquivo (mtime em ns e tamanho),
+        usada para invalidar o cache quando o dataset é alterado.
+    '''
+    
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def snapshot_path(path=DATASET_PATH):
+    
+    '''
+        Esta função retorna o caminho do snapshot Parquet do dataset limpo,
+        gravado ao lado do CSV (ex.: dataset/train.parquet).
+    '''
+    
+    return os.path.splitext(path)[0] + '.parquet'
+
+
+def to_arrow(df1, schema=None):
+    
+    '''
+        Esta função converte o dataframe preparado em tabela Arrow, marcando a
+        versão do esquema do snapshot nos metadados. O ID volta a ser gravado
+        como texto.
+    '''
+    
+    if ORDER_IDS in df1.attrs:
+        df1 = df1.assign(ID=order_ids(df1))
+    table = pa.Table.from_pandas(df1, schema=schema, preserve_index=False)
+    metadata = dict(table.schema.metadata or {}, curry_version=SNAPSHOT_VERSION)
+    return table.replace_schema_metadata(metadata)
+
+
+def build_snapshot(path=DATASET_PATH):
+    
+    '''
+        Esta função tem a responsabilidade de ler o CSV, preparar os dados e
+        gravar o resultado tipado em Parquet.
+
+        A gravação é feita em um arquivo temporário e depois renomeada, para
+        que um leitor concorrente nunca veja um snapshot pela metade.
+        
+        Input: Caminho do arquivo CSV
+        Output: Dataframe limpo
+    '''
+    
+    df1 = prepare_data(read_orders(path))
+    
+    snapshot = snapshot_path(path)
+    tmp_path = '{}.{}.tmp'.format(snapshot, os.getpid())
+    try:
+        pq.write_table(to_arrow(df1), tmp_path)
+        os.replace(tmp_path, snapshot)
+    except OSError:
+        # Diretório somente leitura: seguimos sem snapshot
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    return df1
+
+
+def snapshot_version(snapshot):
+    
+    '''
+        Esta função retorna a versão do esquema gravada no snapshot (ou None).
+    '''
+    
+    metadata = pq.read_schema(snapshot).metadata or {}
+    version = metadata.get(b'curry_version')
+    return version.decode() if version is not None else None
+
+
+def read_snapshot(snapshot):
+    
+    '''
+        Esta função lê um Parquet do dataset limpo direto para o layout
+        compacto: as colunas de dicionário voltam categóricas e o ID é
+        codificado ainda no Arrow, sem criar um objeto Python por linha.
+    '''
+    
+    table = pq.read_table(snapshot)
+    codes, lookup = encode_ids(table.column('ID'))
+    
+    df1 = table.drop(['ID']).to_pandas()
+    df1.insert(0, 'ID', codes)
+    for col in CATEGORY_COLUMNS:
+        if not isinstance(df1[col].dtype, pd.CategoricalDtype):
+            df1[col] = df1[col].astype('category')
+    df1 = df1.astype(COMPACT_DTYPES)
+    df1.attrs[ORDER_IDS] = lookup
+    return df1
+
+
+def read_private(path=DATASET_PATH):
+    
+    '''
+        Esta função retorna uma cópia do dataset limpo só deste processo,
+        lendo o snapshot Parquet quando ele é mais novo que o CSV e da versão
+        atual, e reconstruindo o snapshot caso contrário. Um caminho .parquet (ex.: gerado pela ingestão em
+        blocos) é lido diretamente.
+    '''
+    
+    if path.endswith('.parquet'):
+        return read_snapshot(path)
+    
+    snapshot = snapshot_path(path)
+    if (os.path.exists(snapshot)
+            and os.stat(snapshot).st_mtime_ns >= os.stat(path).st_mtime_ns
+            and snapshot_version(snapshot) == SNAPSHOT_VERSION):
+        return read_snapshot(snapshot)
+    
+    return build_snapshot(path)
+
+
+def shared_path(path=DATASET_PATH):
+    
+    '''
+        Esta função retorna o caminho do arquivo Arrow compartilhado do
+        dataset, gravado ao lado da origem (ex.: dataset/train.arrow).
+    '''
+    
+    return os.path.splitext(path)[0] + '.arrow'
+
+
+def shared_metadata(shared):
+    
+    '''
+        Esta função retorna os metadados do arquivo Arrow compartilhado (ou
+        um dicionário vazio se ele não existe).
+    '''
+    
+    try:
+        with pa.memory_map(shared, 'r') as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return {}
+    return {chave.decode(): valor.decode() for chave, valor in metadata.items()}
+
+
+def shared_fresh(shared, path):
+    
+    '''
+        Esta função indica se o arquivo compartilhado é da versão atual do
+        esquema e foi gerado a partir da versão atual da origem.
+    '''
+    
+    metadata = shared_metadata(shared)
+    return (metadata.get('curry_version') == SNAPSHOT_VERSION
+            and metadata.get('curry_source') == dataset_version(path))
+
+
+@contextlib.contextmanager
+def build_lock(shared):
+    
+    '''
+        Trava entre processos (flock em <arquivo>.lock) para que apenas um
+        worker reconstrua o arquivo compartilhado; os demais esperam e depois
+        mapeiam o arquivo gravado. Sem fcntl ou em diretório somente leitura
+        segue sem trava.
+    '''
+    
+    try:
+        lock_file = open(shared + '.lock', 'a') if fcntl is not None else None
+    except OSError:
+        lock_file = None
+    
+    if lock_file is None:
+        yield
+        return
+    
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+    finally:
+        lock_file.close()
+
+
+def write_shared(df1, shared, source):
+    
+    '''
+        Esta função grava o dataframe compacto como arquivo Arrow IPC sem
+        compressão e em um único lote, o formato que os workers mapeiam em
+        memória. O ID é gravado como dicionário (códigos + tabela de consulta).
+
+        A gravação é feita em um temporário e publicada com os.replace: quem
+        já mapeou o arquivo anterior continua lendo a versão antiga até
+        recarregar, e quem abre o caminho passa a ver a nova.
+        
+        Input: Dataframe compacto, caminho do arquivo e versão da origem
+               (dataset_version)
+    '''
+    
+    ids = pa.DictionaryArray.from_arrays(pa.array(df1['ID'].to_numpy()), df1.attrs[ORDER_IDS])
+    table = pa.Table.from_pandas(df1.drop(columns='ID'), preserve_index=False).add_column(0, 'ID', ids)
+    metadata = dict(table.schema.metadata or {}, curry_version=SNAPSHOT_VERSION, curry_source=source)
+    table = table.replace_schema_metadata(metadata).combine_chunks()
+    
+    tmp_path = '{}.{}.tmp'.format(shared, os.getpid())
+    try:
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=max(table.num_rows, 1))
+        os.replace(tmp_path, shared)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_shared(shared):
+    
+    '''
+        Esta função mapeia o arquivo Arrow compartilhado em memória (somente
+        leitura) e retorna o dataframe compacto.
+
+        As colunas numéricas e os códigos das categorias sem dado ausente
+        apontam direto para as páginas do arquivo: os workers do mesmo host
+        dividem uma única cópia física, e nada é interpretado na carga. Os
+        arrays resultantes não aceitam escrita.
+    '''
+    
+    with pa.memory_map(shared, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    
+    ids = table.column('ID').combine_chunks()
+    df1 = table.drop(['ID']).to_pandas(split_blocks=True)
+    df1.insert(0, 'ID', ids.indices.to_numpy())
+    df1.attrs[ORDER_IDS] = ids.dictionary
+    return df1
+
+
+def publish_shared(path=DATASET_PATH, rebuild=False):
+    
+    '''
+        Esta função grava (sob a trava entre processos) o arquivo Arrow
+        compartilhado a partir do CSV ou Parquet em path e retorna o
+        dataframe mapeado. Com rebuild o CSV é lido e limpo de novo.
+    '''
+    
+    shared = shared_path(path)
+    with build_lock(shared):
+        # Outro worker pode ter gravado o arquivo enquanto esperávamos a trava
+        if not rebuild and shared_fresh(shared, path):
+            return read_shared(shared)
+        
+        df1 = build_snapshot(path) if rebuild else read_private(path)
+        try:
+            write_shared(df1, shared, dataset_version(path))
+        except OSError:
+            # Diretório somente leitura: cada processo fica com a sua cópia
+            return df1
+    
+    return read_shared(shared)
+
+
+def read_clean(path=DATASET_PATH):
+    
+    '''
+        Esta função retorna o dataset limpo mapeando o arquivo Arrow
+        compartilhado quando ele corresponde à versão atual da origem (CSV ou
+        Parquet), e gerando-o caso contrário. Um caminho .arrow é mapeado
+        diretamente.
+    '''
+    
+    if path.endswith('.arrow'):
+        return read_shared(path)
+    
+    shared = shared_path(path)
+    if shared_fresh(shared, path):
+        return read_shared(shared)
+    
+    return publish_shared(path)
+
+
+def load_signature(path):
+    
+    '''
+        Esta função retorna a assinatura usada pelo cache por processo: a da
+        origem e a do arquivo Arrow compartilhado (None enquanto ele não
+        existe). Uma nova ingestão regrava o arquivo compartilhado sem tocar
+        no CSV, e os workers em execução passam a mapear a versão publicada.
+    '''
+    
+    try:
+        shared = file_signature(shared_path(path))
+    except OSError:
+        shared = None
+    return (file_signature(path), shared)
+
+
+def load_derived(name, builder, path=DATASET_PATH):
+    
+    '''
+        Esta função memoiza por processo uma estrutura construída a partir do
+        dataset (o próprio dataframe limpo, o cubo, índices, ...).
+
+        A estrutura é reconstruída quando a assinatura da origem ou do
+        arquivo compartilhado muda (load_signature).
+        
+        Input: Nome da estrutura, função builder(path) e caminho do CSV
+        Output: Estrutura construída
+    '''
+    
+    path = os.path.abspath(path)
+    signature = load_signature(path)
+    key = (name, path)
+    
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    
+    with _lock:
+        # Outra sessão pode ter construído a estrutura enquanto esperávamos o lock
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        
+        with span('build_' + name) as etapa:
+            value = builder(path)
+            etapa.rows_out = row_count(value)
+        # Assinatura de depois da construção: a primeira carga pode ter
+        # acabado de gravar o arquivo compartilhado
+        _cache[key] = (load_signature(path), value)
+    
+    return value
+
+
+def read_frozen(path=DATASET_PATH):
+    
+    '''
+        Esta função lê o dataset limpo (read_clean) e marca os valores como
+        somente leitura antes de compartilhá-lo entre as sessões.
+    '''
+    
+    return guard(freeze(read_clean(path)))
+
+
+@profiled
+def load_data(path=DATASET_PATH):
+    
+    '''
+        Esta função tem a responsabilidade de carregar e limpar o dataset uma
+        única vez por processo.
+
+        O dataframe limpo fica em memória e é reaproveitado por todas as
+        páginas e sessões enquanto a origem e o arquivo compartilhado não
+        mudarem. Ele é mapeado do arquivo Arrow compartilhado (read_clean),
+        dividido entre os processos do host.
+        O dataframe retornado é compartilhado, sem cópia: as páginas devem
+        apenas filtrá-lo (o que gera um novo dataframe) e nunca alterá-lo. Os
+        valores são somente leitura, as colunas derivadas (distance,
+        date_key) já vêm calculadas e, com CURRY_ASSERT_READONLY=1, cada
+        chamada confere que ninguém adicionou ou trocou colunas
+        (curry.readonly).
+        
+        Input: Caminho do arquivo CSV
+        Output: Dataframe limpo
+    '''
+    
+    return check(load_derived('data', read_frozen, path), 'o dataframe compartilhado')
+
+
+def load_calendar(path=DATASET_PATH):
+    
+    '''
+        Esta função retorna a dimensão calendário das datas do dataset,
+        calculada uma única vez por versão do arquivo. As colunas de semana,
+        dia da semana e mês chegam aos pedidos por date_key (join_calendar).
+    '''
+    
+    return load_derived('calendar', lambda p: freeze(calendar_table(load_data(p)['Order_Date'])), path)
+
+
+def dataset_version(path=DATASET_PATH):
+    
+    '''
+        Esta função retorna uma string que identifica a versão atual do dataset.
+    '''
+    
+    mtime_ns, size = file_signature(os.path.abspath(path))
+    return '{:x}-{:x}'.format(mtime_ns, size)
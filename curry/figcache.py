@@ -0,0 +1,105 @@
+#================================================================================
+#==========        Cache LRU de figuras Plotly
+#================================================================================
+
+'''
+    Cache LRU das figuras Plotly, compartilhado entre sessões.
+
+    A chave é (página, gráfico, versão do dataset, filtros ativos). O tamanho de
+    cada entrada é o tamanho do JSON da figura, e as entradas menos usadas são
+    descartadas quando o total passa do orçamento de memória
+    (CURRY_FIGURE_CACHE_MB, padrão 64 MiB). As figuras guardadas são
+    compartilhadas: quem as recebe deve apenas exibi-las, nunca alterá-las.
+'''
+
+import os
+import threading
+from collections import OrderedDict
+
+from curry.data import dataset_version
+from curry.profiling import span
+
+
+class SizedCache:
+    
+    '''
+        Cache LRU limitado por bytes, com contadores de acertos e faltas.
+        sizeof(valor) dá o tamanho de cada entrada.
+    '''
+    
+    def __init__(self, max_bytes, sizeof):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_or_build(self, key, builder):
+        
+        '''
+            Esta função retorna o valor da chave, construindo-o com builder()
+            quando ele não está no cache.
+        '''
+        
+        with self._lock:
+            entrada = self._entries.get(key)
+            if entrada is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entrada[0]
+            self.misses += 1
+        
+        value = builder()
+        tamanho = self.sizeof(value)
+        
+        with self._lock:
+            if key not in self._entries and tamanho <= self.max_bytes:
+                self._entries[key] = (value, tamanho)
+                self.bytes += tamanho
+                while self.bytes > self.max_bytes:
+                    _, (_, removido) = self._entries.popitem(last=False)
+                    self.bytes -= removido
+                    self.evictions += 1
+        
+        return value
+    
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._entries), 'bytes': self.bytes, 'max_bytes': self.max_bytes}
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+class FigureCache(SizedCache):
+    
+    '''
+        Cache de figuras Plotly, com o tamanho medido pelo JSON da figura.
+    '''
+    
+    def __init__(self, max_bytes):
+        super().__init__(max_bytes, lambda fig: len(fig.to_json()))
+
+
+figure_cache = FigureCache(int(float(os.environ.get('CURRY_FIGURE_CACHE_MB', 64)) * 2 ** 20))
+
+
+def cached_figure(page, chart, filters, builder):
+    
+    '''
+        Esta função retorna a figura do gráfico chart da página page para os
+        filtros ativos, reaproveitando o cache quando possível.
+        
+        Input: Nome da página, nome do gráfico, tupla com os filtros ativos e
+               função sem argumentos que constrói a figura
+        Output: Figura Plotly
+    '''
+    
+    with span('figure ' + chart):
+        return figure_cache.get_or_build((page, chart, dataset_version(), filters), builder)
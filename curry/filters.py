@@ -0,0 +1,75 @@
+#================================================================================
+#==========        Filtros da barra lateral
+#================================================================================
+
+import datetime
+
+import streamlit as st
+
+
+# Período coberto pelo dataset
+DATE_MIN = datetime.datetime(2022, 2, 11)
+DATE_MAX = datetime.datetime(2022, 4, 6)
+
+
+def date_filter():
+    
+    '''
+        Esta função desenha na barra lateral o filtro de data, que pode ser uma
+        data limite (todos os pedidos até a data) ou um intervalo de datas.
+        
+        Output: (data inicial, data final); a data inicial é None no modo
+                data limite
+    '''
+    
+    st.sidebar.markdown('## Selecione uma data limite')
+    
+    modo = st.sidebar.radio('Filtrar por', ['Data limite', 'Intervalo'], horizontal=True)
+    
+    if modo == 'Intervalo':
+        date_start, date_end = st.sidebar.slider(
+            'Qual intervalo?',
+            value=(DATE_MIN, DATE_MAX),
+            min_value=DATE_MIN,
+            max_value=DATE_MAX,
+            format='DD-MM-YYYY')
+        return date_start, date_end
+    
+    date_end = st.sidebar.slider(
+        'Até qual valor?',
+        value=DATE_MAX,
+        min_value=DATE_MIN,
+        max_value=DATE_MAX,
+        format='DD-MM-YYYY')
+    return None, date_end
+
+
+@st.cache_resource
+def load_image(path):
+    
+    '''
+        Esta função lê uma imagem estática (logos da barra lateral) uma única
+        vez por processo; st.image recebe os bytes diretamente.
+    '''
+    
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def view_selector(views):
+    
+    '''
+        Esta função desenha o seletor das visões da página e retorna a visão
+        ativa.
+        
+        Substitui st.tabs: com abas, o corpo de todas elas é executado a cada
+        rerun; com o seletor a página executa apenas o bloco da visão ativa, e
+        as visões já abertas voltam dos caches de KPIs, figuras e mapas.
+        
+        Input: Lista com os nomes das visões
+        Output: Nome da visão ativa
+    '''
+    
+    if len(views) == 1:
+        return views[0]
+    return st.radio('Visão', views, horizontal=True, label_visibility='collapsed')
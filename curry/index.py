@@ -0,0 +1,113 @@
+#================================================================================
+#==========        Índices bitmap dos filtros
+#================================================================================
+
+'''
+    Índice bitmap sobre as linhas do dataset limpo.
+
+    Para cada valor de trânsito, de clima e para cada data guardamos uma máscara
+    de bits (np.packbits) com as linhas que possuem aquele valor. Um multiselect
+    vira um OR entre as máscaras dos valores escolhidos e a combinação dos filtros
+    um AND entre elas; só no final as posições das linhas são extraídas.
+'''
+
+import numpy as np
+
+from curry.data import DATASET_PATH, load_data, load_derived
+from curry.profiling import profiled
+
+
+# Nome do filtro -> coluna indexada
+INDEXED_COLUMNS = {
+    'traffic': 'Road_traffic_density',
+    'weather': 'Weatherconditions',
+}
+
+
+def bitmaps(col):
+    
+    '''
+        Esta função cria uma máscara de bits compactada para cada valor
+        distinto da coluna.
+        
+        Input: Series
+        Output: Dicionário valor -> array uint8 (np.packbits)
+    '''
+    
+    codes, valores = col.factorize(sort=True)
+    return {valor: np.packbits(codes == i) for i, valor in enumerate(valores)}
+
+
+class BitmapIndex:
+    
+    '''
+        Máscaras de bits por valor de cada coluna filtrável e por data.
+    '''
+    
+    def __init__(self, df1):
+        self.n_rows = len(df1)
+        self.columns = {nome: bitmaps(df1[col]) for nome, col in INDEXED_COLUMNS.items()}
+        
+        # Datas em ordem crescente, com as máscaras na mesma ordem
+        datas = bitmaps(df1['Order_Date'])
+        self.date_keys = np.array(list(datas), dtype='datetime64[ns]')
+        self.date_bits = list(datas.values())
+        self._all = np.packbits(np.ones(self.n_rows, dtype=bool))
+        self._none = np.zeros_like(self._all)
+    
+    def select(self, nome, valores):
+        
+        '''
+            Esta função retorna o OR das máscaras dos valores escolhidos
+            (equivalente a isin). Valores inexistentes são ignorados.
+        '''
+        
+        mascaras = [self.columns[nome][v] for v in valores if v in self.columns[nome]]
+        if not mascaras:
+            return self._none
+        return np.bitwise_or.reduce(mascaras)
+    
+    def date_range(self, date_min=None, date_max=None):
+        
+        '''
+            Esta função retorna o OR das máscaras das datas no intervalo.
+        '''
+        
+        inicio = 0 if date_min is None else np.searchsorted(self.date_keys, np.datetime64(date_min), side='left')
+        fim = len(self.date_keys) if date_max is None else np.searchsorted(self.date_keys, np.datetime64(date_max), side='right')
+        
+        if inicio == 0 and fim == len(self.date_keys):
+            return self._all
+        if fim <= inicio:
+            return self._none
+        return np.bitwise_or.reduce(self.date_bits[inicio:fim])
+    
+    @profiled(name='BitmapIndex.positions')
+    def positions(self, date_min=None, date_max=None, traffic=None, weather=None):
+        
+        '''
+            Esta função combina os filtros da barra lateral e retorna as
+            posições das linhas selecionadas. Filtros com valor None não são
+            aplicados.
+            
+            Input: Data inicial, data limite, condições de trânsito e climáticas
+            Output: Array com as posições (para df1.take)
+        '''
+        
+        bits = self.date_range(date_min, date_max)
+        if traffic is not None:
+            bits = bits & self.select('traffic', traffic)
+        if weather is not None:
+            bits = bits & self.select('weather', weather)
+        
+        return np.flatnonzero(np.unpackbits(bits, count=self.n_rows))
+
+
+def load_index(path=DATASET_PATH):
+    
+    '''
+        Esta função retorna o índice bitmap do dataset, construído uma vez por
+        processo.
+    '''
+    
+    return load_derived('index', lambda p: BitmapIndex(load_data(p)), path)
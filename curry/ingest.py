@@ -0,0 +1,237 @@
+#================================================================================
+#==========        Ingestão: CSV -> snapshot Parquet e Arrow compartilhado
+#================================================================================
+
+'''
+    Gera (ou atualiza) o snapshot Parquet do dataset limpo e o arquivo Arrow
+    compartilhado que os workers do painel mapeiam em memória. O arquivo é
+    trocado de forma atômica: os workers em execução passam a usá-lo na
+    próxima carga, sem reiniciar.
+
+    Uso:
+        python -m curry.ingest [caminho/do/train.csv]
+
+    Para exportações maiores que a memória, a ingestão em blocos lê um ou mais
+    CSVs em pedaços, limpa cada bloco com as mesmas regras, grava o resultado
+    em um único Parquet e acumula agregados combináveis (contagens, média e
+    variância de Welford, conjuntos distintos), com memória limitada pelo
+    tamanho do bloco:
+
+        python -m curry.ingest --stream --output dataset/orders.parquet exports/*.csv
+
+    O painel pode então ser apontado para o Parquet com CURRY_DATASET.
+    
+    O relatório de memória compara os bytes por coluna do dataset carregado
+    no layout compacto com o layout anterior (texto em object, números em 64
+    bits):
+    
+        python -m curry.ingest --memory-report
+'''
+
+import argparse
+import os
+import resource
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from curry.data import (DATASET_PATH, memory_report, prepare_data, publish_shared, read_clean, read_orders,
+                        shared_path, snapshot_path, to_arrow)
+
+
+CHUNKSIZE = 100000
+
+
+class RunningStats:
+    
+    '''
+        Média e variância combináveis entre blocos (Welford, com a fórmula de
+        Chan para juntar dois conjuntos de momentos).
+    '''
+    
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+    
+    def merge(self, n, mean, m2):
+        if n == 0:
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.n * n / total
+        self.n = total
+    
+    def update(self, valores):
+        valores = np.asarray(valores, dtype='float64')
+        valores = valores[~np.isnan(valores)]
+        if len(valores):
+            media = valores.mean()
+            self.merge(len(valores), media, ((valores - media) ** 2).sum())
+    
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else np.nan
+
+
+class StreamAggregates:
+    
+    '''
+        Agregados acumulados durante a ingestão em blocos.
+    '''
+    
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_kept = 0
+        self.orders_by_city = {}
+        self.time = RunningStats()
+        self.distance = RunningStats()
+        self.rating = RunningStats()
+        self.time_by_city_traffic = {}
+        self.couriers = set()
+    
+    def update(self, df_raw, df1):
+        self.rows_read += len(df_raw)
+        self.rows_kept += len(df1)
+        
+        for cidade, n in df1['City'].value_counts().items():
+            self.orders_by_city[cidade] = self.orders_by_city.get(cidade, 0) + n
+        
+        self.time.update(df1['Time_taken(min)'])
+        self.distance.update(df1['distance'])
+        self.rating.update(df1['Delivery_person_Ratings'])
+        
+        grupos = df1.groupby(['City', 'Road_traffic_density'], observed=True)['Time_taken(min)']
+        for chave, n, media, variancia in zip(grupos.count().index, grupos.count(), grupos.mean(), grupos.var(ddof=0)):
+            stats = self.time_by_city_traffic.setdefault(chave, RunningStats())
+            stats.merge(n, media, variancia * n)
+        
+        self.couriers.update(df1['Delivery_person_ID'].unique())
+
+
+def arrow_schema(df1):
+    
+    '''
+        Esta função define o esquema do Parquet a partir do primeiro bloco.
+        Colunas totalmente vazias no bloco viram texto, para que os blocos
+        seguintes (com valores) sejam compatíveis. As colunas categóricas usam
+        índices int32: os blocos seguintes podem ter mais categorias.
+    '''
+    
+    schema = to_arrow(df1).schema
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, pa.field(field.name, pa.string()))
+        elif pa.types.is_dictionary(field.type):
+            valores = pa.string() if pa.types.is_null(field.type.value_type) else field.type.value_type
+            schema = schema.set(i, pa.field(field.name, pa.dictionary(pa.int32(), valores)))
+    return schema
+
+
+def stream_ingest(paths, output, chunksize=CHUNKSIZE):
+    
+    '''
+        Esta função tem a responsabilidade de ingerir um ou mais CSVs em blocos.
+
+        Cada bloco é limpo e preparado com prepare_data, anexado ao Parquet de
+        saída e acumulado nos agregados. O arquivo é gravado em um temporário e
+        renomeado no final.
+        
+        Input: Lista de CSVs, caminho do Parquet de saída e linhas por bloco
+        Output: StreamAggregates
+    '''
+    
+    aggregates = StreamAggregates()
+    tmp_path = '{}.{}.tmp'.format(output, os.getpid())
+    writer = None
+    
+    try:
+        for path in paths:
+            for df_raw in read_orders(path, chunksize=chunksize):
+                df1 = prepare_data(df_raw)
+                if writer is None:
+                    schema = arrow_schema(df1)
+                    writer = pq.ParquetWriter(tmp_path, schema)
+                writer.write_table(to_arrow(df1, schema=schema))
+                aggregates.update(df_raw, df1)
+        
+        if writer is not None:
+            writer.close()
+            writer = None
+            os.replace(tmp_path, output)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    return aggregates
+
+
+def peak_rss():
+    
+    '''
+        Esta função retorna o pico de memória residente do processo em bytes.
+    '''
+    
+    # ru_maxrss é informado em KiB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def print_report(aggregates, input_bytes, duracao, rss_inicial=0):
+    mib = 2 ** 20
+    print('linhas lidas: {}  linhas limpas: {}  ({:.2f}s)'.format(aggregates.rows_read, aggregates.rows_kept, duracao))
+    print('pedidos por cidade: {}'.format(aggregates.orders_by_city))
+    print('entregadores distintos: {}'.format(len(aggregates.couriers)))
+    print('tempo de entrega: média {:.2f}  desvio {:.2f}'.format(aggregates.time.mean, aggregates.time.std))
+    print('distância: média {:.2f}  desvio {:.2f}'.format(aggregates.distance.mean, aggregates.distance.std))
+    print('avaliação: média {:.2f}  desvio {:.2f}'.format(aggregates.rating.mean, aggregates.rating.std))
+    for (cidade, transito), stats in sorted(aggregates.time_by_city_traffic.items()):
+        print('  {:<15} {:<8} n={:<8} média {:.2f}  desvio {:.2f}'.format(cidade, transito, stats.n, stats.mean, stats.std))
+    print('entrada: {:.1f} MiB  pico de RSS: {:.1f} MiB (antes da ingestão: {:.1f} MiB)  RSS/entrada = {:.2f}'.format(
+        input_bytes / mib, peak_rss() / mib, rss_inicial / mib, peak_rss() / max(input_bytes, 1)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m curry.ingest', description='Gera o snapshot Parquet e o arquivo Arrow do dataset limpo.')
+    parser.add_argument('paths', nargs='*', default=[DATASET_PATH], help='CSV(s) de pedidos')
+    parser.add_argument('--stream', action='store_true', help='ingestão em blocos, com memória limitada')
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE, help='linhas por bloco no modo --stream')
+    parser.add_argument('--output', help='Parquet de saída no modo --stream (obrigatório com mais de um CSV)')
+    parser.add_argument('--memory-report', action='store_true',
+                        help='mostra os bytes por coluna do dataset carregado, antes e depois do layout compacto')
+    args = parser.parse_args(argv)
+    
+    inicio = time.perf_counter()
+    
+    if args.memory_report:
+        for path in args.paths:
+            print(path)
+            print(memory_report(read_clean(path)).to_string())
+        return
+    
+    if not args.stream:
+        for path in args.paths:
+            df1 = publish_shared(path, rebuild=True)
+            print('{} linhas limpas gravadas em {} e {} ({:.2f}s)'.format(len(df1), snapshot_path(path), shared_path(path),
+                                                                          time.perf_counter() - inicio))
+        return
+    
+    if args.output is None and len(args.paths) > 1:
+        # o snapshot do primeiro CSV seria trocado pela junção de todos
+        parser.error('--output é obrigatório no modo --stream com mais de um CSV')
+    
+    output = args.output or snapshot_path(args.paths[0])
+    rss_inicial = peak_rss()
+    aggregates = stream_ingest(args.paths, output, chunksize=args.chunksize)
+    duracao = time.perf_counter() - inicio
+    
+    print('{} gravado'.format(output))
+    print_report(aggregates, sum(os.path.getsize(p) for p in args.paths), duracao, rss_inicial)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,483 @@
+#================================================================================
+#==========        KPIs do painel
+#================================================================================
+
+'''
+    Cálculo dos KPIs mostrados nas três páginas, fora do Streamlit.
+    
+    Cada KPI é uma função dos filtros do painel (date_min, date_max, traffic,
+    weather; None não filtra) que devolve um dataframe, um dicionário ou um
+    número, sem figuras. As páginas montam os gráficos a partir desses
+    resultados e a API HTTP (curry.api) os serve em JSON.
+    
+    compute() lê primeiro o store materializado por curry.materialize (quando
+    ele está atualizado e cobre os filtros) e guarda os resultados em um cache
+    LRU compartilhado pelo processo,
+    com a chave (KPI, versão do dataset, filtros, parâmetros), limitado por
+    CURRY_KPI_CACHE_MB (padrão 64 MiB). Os resultados guardados são
+    compartilhados: quem os recebe não deve alterá-los.
+'''
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from curry.cube import filter_cube, load_cube, load_prefix, rollup
+from curry.data import dataset_version, date_keys, join_calendar, load_calendar, load_data, widen
+from curry.figcache import SizedCache
+from curry.index import load_index
+from curry.materialize import materialized
+from curry.profiling import row_count, span
+from curry.ranking import top_bottom_k
+from curry.readonly import check, guard
+from curry.sketches import QUANTILES, load_sketches, load_time_sketches, quantile_labels
+from curry.spatial import distance_histogram, restaurant_radius_stats
+
+
+#================================================================================
+#==========        Recortes filtrados
+#================================================================================
+
+def filtered_positions(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Esta função retorna as posições das linhas do dataset que passam nos
+        filtros (índice bitmap).
+    '''
+    
+    return load_index().positions(date_min=date_min, date_max=date_max, traffic=traffic, weather=weather)
+
+
+def filtered_orders(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Esta função retorna os pedidos que passam nos filtros.
+    '''
+    
+    return load_data().take(filtered_positions(date_min, date_max, traffic, weather))
+
+
+def filtered_cube(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Esta função retorna as células diárias do cubo que passam nos filtros.
+    '''
+    
+    return filter_cube(load_cube(), date_max=date_max, traffic=traffic, weather=weather, date_min=date_min)
+
+
+def filtered_totals(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Esta função retorna os totais do período no cubo (somas acumuladas),
+        para os KPIs que não dependem da data.
+    '''
+    
+    return load_prefix().totals(date_min=date_min, date_max=date_max, traffic=traffic, weather=weather)
+
+
+#================================================================================
+#==========        Visão Empresa
+#================================================================================
+
+def orders_by_day(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Output: Dataframe com as colunas 'Order_Date' e 'orders'
+    '''
+    
+    return (rollup(filtered_cube(date_min, date_max, traffic, weather), ['Order_Date'])
+               .rename(columns={'count': 'orders'}))
+
+
+def orders_by_week(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Output: Dataframe com as colunas 'year_week' (ano * 100 + semana) e
+                'orders'
+    '''
+    
+    df_aux = orders_by_day(date_min, date_max, traffic, weather)
+    semanas = join_calendar(load_calendar(), date_keys(df_aux['Order_Date']), 'year_week')
+    return (df_aux.groupby(semanas)['orders']
+               .sum()
+               .rename_axis('year_week')
+               .reset_index())
+
+
+def order_share_by_week(date_min=None, date_max=None, traffic=None, weather=None, exact=False):
+    
+    '''
+        Esta função calcula a quantidade de pedidos por entregador em cada
+        semana.
+        
+        exact: conta os entregadores distintos nos pedidos; senão usa a
+               estimativa dos sketches HyperLogLog (erro relativo ~2%)
+        
+        Output: Dataframe com as colunas 'year_week', 'orders', 'couriers' e
+                'order_by_delivery'
+    '''
+    
+    pedidos = orders_by_week(date_min, date_max, traffic, weather)
+    
+    if exact:
+        df1 = filtered_orders(date_min, date_max, traffic, weather)
+        semanas = join_calendar(load_calendar(), df1['date_key'], 'year_week')
+        entregadores = (df1.groupby(semanas)['Delivery_person_ID']
+                           .nunique()
+                           .rename_axis('year_week')
+                           .reset_index())
+    else:
+        entregadores = load_sketches().distinct_by_week(date_min=date_min, date_max=date_max,
+                                                        traffic=traffic, weather=weather)
+    
+    df_aux = pd.merge(pedidos, entregadores.rename(columns={'Delivery_person_ID': 'couriers'}), how='inner')
+    df_aux['order_by_delivery'] = df_aux['orders'] / df_aux['couriers']
+    return df_aux
+
+
+def traffic_order_share(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Output: Dataframe com as colunas 'Road_traffic_density', 'orders' e
+                'share' (fração dos pedidos)
+    '''
+    
+    df_aux = (rollup(filtered_totals(date_min, date_max, traffic, weather), ['Road_traffic_density'])
+                 .rename(columns={'count': 'orders'}))
+    df_aux['share'] = df_aux['orders'] / df_aux['orders'].sum()
+    return df_aux
+
+
+def traffic_order_city(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Output: Dataframe com as colunas 'City', 'Road_traffic_density' e
+                'orders'
+    '''
+    
+    df_aux = (rollup(filtered_totals(date_min, date_max, traffic, weather), ['City', 'Road_traffic_density'])
+                 .rename(columns={'count': 'orders'}))
+    return df_aux
+
+
+#================================================================================
+#==========        Visão Entregadores
+#================================================================================
+
+def operation_calculate(df1, col, operation):
+    
+    '''
+        Esta função aplica a operação ('max', 'min', 'avg' ou 'median') à
+        coluna col dos pedidos. Médias e medianas são calculadas em 64 bits
+        (widen), qualquer que seja o tipo compacto da coluna.
+    '''
+    
+    if operation == 'max':
+        results = df1.loc[:, col].max()
+    
+    elif operation == 'min':
+        results = df1.loc[:, col].min()
+    
+    elif operation == 'avg':
+        results = widen(df1.loc[:, col]).mean()
+    
+    elif operation == 'median':
+        results = widen(df1.loc[:, col]).median()
+    
+    else:
+        results = None
+    
+    return results
+
+
+def courier_overview(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Output: Dicionário com a maior e a menor idade dos entregadores e a
+                melhor e a pior condição dos veículos
+    '''
+    
+    df1 = filtered_orders(date_min, date_max, traffic, weather)
+    return {
+        'max_age': operation_calculate(df1, 'Delivery_person_Age', 'max'),
+        'min_age': operation_calculate(df1, 'Delivery_person_Age', 'min'),
+        'best_vehicle_condition': operation_calculate(df1, 'Vehicle_condition', 'max'),
+        'worst_vehicle_condition': operation_calculate(df1, 'Vehicle_condition', 'min'),
+    }
+
+
+def ratings_by_courier(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Output: Dataframe com as colunas 'Delivery_person_ID' e
+                'Delivery_person_Ratings' (média)
+    '''
+    
+    df1 = filtered_orders(date_min, date_max, traffic, weather)
+    # As avaliações ficam em float32 no layout compacto: a média é feita em float64
+    return (df1.loc[:, ['Delivery_person_ID']]
+               .assign(Delivery_person_Ratings=widen(df1['Delivery_person_Ratings']))
+               .groupby(['Delivery_person_ID'], observed=True)[['Delivery_person_Ratings']]
+               .mean()
+               .sort_index()
+               .reset_index())
+
+
+def ratings_by_traffic(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Output: Dataframe com as colunas 'Road_traffic_density',
+                'delivery_mean' e 'delivery_std'
+    '''
+    
+    return (rollup(filtered_totals(date_min, date_max, traffic, weather), ['Road_traffic_density'], ['rating'])
+               .loc[:, ['Road_traffic_density', 'rating_mean', 'rating_std']]
+               .rename(columns={'rating_mean': 'delivery_mean', 'rating_std': 'delivery_std'}))
+
+
+def ratings_by_weather(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Output: Dataframe com as colunas 'Weatherconditions', 'clima_mean' e
+                'clima_std'
+    '''
+    
+    return (rollup(filtered_totals(date_min, date_max, traffic, weather), ['Weatherconditions'], ['rating'])
+               .loc[:, ['Weatherconditions', 'rating_mean', 'rating_std']]
+               .rename(columns={'rating_mean': 'clima_mean', 'rating_std': 'clima_std'}))
+
+
+def top_couriers(date_min=None, date_max=None, traffic=None, weather=None, k=10):
+    
+    '''
+        Esta função calcula o tempo médio de entrega por entregador e retorna
+        os k entregadores mais rápidos e os k mais lentos de cada cidade.
+        
+        Output: Dicionário com os dataframes 'fastest' e 'slowest'
+    '''
+    
+    df1 = filtered_orders(date_min, date_max, traffic, weather)
+    df2 = (df1.loc[:, ['Delivery_person_ID', 'City', 'Time_taken(min)']]
+               .groupby(['City', 'Delivery_person_ID'], observed=True)
+               .mean()
+               .sort_index()
+               .reset_index())
+    
+    mais_rapidos, mais_lentos = top_bottom_k(df2, 'City', 'Time_taken(min)', k)
+    return {'fastest': mais_rapidos, 'slowest': mais_lentos}
+
+
+#================================================================================
+#==========        Visão Restaurantes
+#================================================================================
+
+def unique_couriers(date_min=None, date_max=None, traffic=None, weather=None, exact=False):
+    
+    '''
+        Esta função retorna a quantidade de entregadores distintos, exata ou
+        estimada pelos sketches HyperLogLog (erro relativo ~2%).
+    '''
+    
+    if exact:
+        return int(filtered_orders(date_min, date_max, traffic, weather)['Delivery_person_ID'].nunique())
+    return load_sketches().distinct(date_min=date_min, date_max=date_max, traffic=traffic, weather=weather)
+
+
+def avg_distance(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Output: Distância média de entrega em km (2 casas decimais)
+    '''
+    
+    df_aux = rollup(filtered_totals(date_min, date_max, traffic, weather), [], ['distance'])
+    return np.round(df_aux.loc[0, 'distance_mean'], 2)
+
+
+def distance_by_city(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Output: Dataframe com as colunas 'City' e 'distance' (média em km)
+    '''
+    
+    return (rollup(filtered_totals(date_min, date_max, traffic, weather), ['City'], ['distance'])
+               .loc[:, ['City', 'distance_mean']]
+               .rename(columns={'distance_mean': 'distance'}))
+
+
+def delivery_time(by, date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Esta função calcula o tempo médio e o desvio padrão do tempo de entrega
+        agrupados pelas dimensões em by.
+        
+        Output: Dataframe com as colunas de by, 'avg_time' e 'std_time'
+    '''
+    
+    return (rollup(filtered_totals(date_min, date_max, traffic, weather), list(by), ['time'])
+               .drop(columns='count')
+               .rename(columns={'time_mean': 'avg_time', 'time_std': 'std_time'}))
+
+
+def delivery_time_by_festival(date_min=None, date_max=None, traffic=None, weather=None):
+    return delivery_time(['Festival'], date_min, date_max, traffic, weather)
+
+
+def delivery_time_by_city(date_min=None, date_max=None, traffic=None, weather=None):
+    return delivery_time(['City'], date_min, date_max, traffic, weather)
+
+
+def delivery_time_by_city_traffic(date_min=None, date_max=None, traffic=None, weather=None):
+    return delivery_time(['City', 'Road_traffic_density'], date_min, date_max, traffic, weather)
+
+
+def delivery_time_by_city_order_type(date_min=None, date_max=None, traffic=None, weather=None):
+    return delivery_time(['City', 'Type_of_order'], date_min, date_max, traffic, weather)
+
+
+def delivery_time_percentiles(by=(), date_min=None, date_max=None, traffic=None, weather=None, exact=False):
+    
+    '''
+        Esta função calcula os percentis do tempo de entrega (p50, p90 e p99)
+        agrupados pelas dimensões em by.
+        
+        exact: quantis exatos sobre os pedidos (quantile com
+               interpolation='lower'); senão usa os sketches DDSketch por
+               célula (erro relativo de no máximo 1%)
+        
+        Output: Dataframe com as colunas de by, 'orders', 'p50', 'p90' e 'p99'
+    '''
+    
+    by = list(by)
+    if not exact:
+        return load_time_sketches().quantiles(by, date_min=date_min, date_max=date_max, traffic=traffic, weather=weather)
+    
+    df1 = filtered_orders(date_min, date_max, traffic, weather)
+    tempos = df1['Time_taken(min)'].astype('float64')
+    if not by:
+        return pd.DataFrame([[len(tempos)] + [tempos.quantile(q, interpolation='lower') for q in QUANTILES]],
+                            columns=['orders'] + quantile_labels())
+    
+    grupos = tempos.groupby([df1[c] for c in by], observed=True)
+    df_aux = grupos.quantile(QUANTILES, interpolation='lower').unstack().reindex(columns=QUANTILES)
+    df_aux.columns = quantile_labels()
+    df_aux.insert(0, 'orders', grupos.size())
+    return df_aux.sort_index().reset_index()
+
+
+def delivery_time_percentiles_overall(date_min=None, date_max=None, traffic=None, weather=None, exact=False):
+    return delivery_time_percentiles([], date_min, date_max, traffic, weather, exact)
+
+
+def delivery_time_percentiles_by_city(date_min=None, date_max=None, traffic=None, weather=None, exact=False):
+    return delivery_time_percentiles(['City'], date_min, date_max, traffic, weather, exact)
+
+
+def delivery_time_percentiles_by_city_traffic(date_min=None, date_max=None, traffic=None, weather=None, exact=False):
+    return delivery_time_percentiles(['City', 'Road_traffic_density'], date_min, date_max, traffic, weather, exact)
+
+
+def restaurant_radius(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Output: Dataframe com os pedidos e as estatísticas da distância de
+                entrega de cada restaurante
+    '''
+    
+    return restaurant_radius_stats(filtered_orders(date_min, date_max, traffic, weather))
+
+
+def delivery_distance_histogram(date_min=None, date_max=None, traffic=None, weather=None, bins=20):
+    
+    '''
+        Output: Dataframe com as colunas 'City', 'distance_km' e 'orders'
+    '''
+    
+    return distance_histogram(filtered_orders(date_min, date_max, traffic, weather), bins=bins)
+
+
+#================================================================================
+#==========        Registro e cache
+#================================================================================
+
+# KPIs servidos pela API, com os parâmetros extras que cada um aceita
+KPIS = {
+    'orders_by_day': (orders_by_day, {}),
+    'orders_by_week': (orders_by_week, {}),
+    'order_share_by_week': (order_share_by_week, {'exact': bool}),
+    'traffic_order_share': (traffic_order_share, {}),
+    'traffic_order_city': (traffic_order_city, {}),
+    'courier_overview': (courier_overview, {}),
+    'ratings_by_courier': (ratings_by_courier, {}),
+    'ratings_by_traffic': (ratings_by_traffic, {}),
+    'ratings_by_weather': (ratings_by_weather, {}),
+    'top_couriers': (top_couriers, {'k': int}),
+    'unique_couriers': (unique_couriers, {'exact': bool}),
+    'avg_distance': (avg_distance, {}),
+    'distance_by_city': (distance_by_city, {}),
+    'delivery_time_by_festival': (delivery_time_by_festival, {}),
+    'delivery_time_by_city': (delivery_time_by_city, {}),
+    'delivery_time_by_city_traffic': (delivery_time_by_city_traffic, {}),
+    'delivery_time_by_city_order_type': (delivery_time_by_city_order_type, {}),
+    'delivery_time_percentiles': (delivery_time_percentiles_overall, {'exact': bool}),
+    'delivery_time_percentiles_by_city': (delivery_time_percentiles_by_city, {'exact': bool}),
+    'delivery_time_percentiles_by_city_traffic': (delivery_time_percentiles_by_city_traffic, {'exact': bool}),
+    'restaurant_radius': (restaurant_radius, {}),
+    'delivery_distance_histogram': (delivery_distance_histogram, {'bins': int}),
+}
+
+
+def result_size(value):
+    
+    '''
+        Esta função estima o tamanho em bytes de um resultado de KPI.
+    '''
+    
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, dict):
+        return sum(result_size(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+kpi_cache = SizedCache(int(float(os.environ.get('CURRY_KPI_CACHE_MB', 64)) * 2 ** 20), result_size)
+
+
+def filter_key(date_min=None, date_max=None, traffic=None, weather=None):
+    
+    '''
+        Esta função normaliza os filtros em uma tupla usada como chave de
+        cache (datas como Timestamp, listas ordenadas).
+    '''
+    
+    return (None if date_min is None else pd.Timestamp(date_min),
+            None if date_max is None else pd.Timestamp(date_max),
+            None if traffic is None else tuple(sorted(traffic)),
+            None if weather is None else tuple(sorted(weather)))
+
+
+def compute(name, date_min=None, date_max=None, traffic=None, weather=None, **params):
+    
+    '''
+        Esta função retorna o KPI name para os filtros, lido do store
+        materializado quando possível e calculado na hora nos demais casos,
+        reaproveitando o cache compartilhado pelas páginas e pela API.
+        
+        Input: Nome do KPI (chave de KPIS), filtros e parâmetros extras do KPI
+        Output: Resultado do KPI
+    '''
+    
+    func, _ = KPIS[name]
+    filtros = filter_key(date_min, date_max, traffic, weather)
+    key = (name, dataset_version(), filtros, tuple(sorted(params.items())))
+    
+    def build():
+        result = materialized(name, *filtros, **params)
+        return guard(func(*filtros, **params) if result is None else result)
+    
+    with span('kpi ' + name) as etapa:
+        result = check(kpi_cache.get_or_build(key, build), 'o KPI ' + name)
+        etapa.rows_out = row_count(result)
+    return result
@@ -0,0 +1,131 @@
+#================================================================================
+#==========        Mapa agregado das entregas
+#================================================================================
+
+'''
+    Mapa das entregas com tamanho de HTML limitado.
+
+    Os locais de entrega são agregados no servidor em uma grade regular (contagem,
+    tempo mediano e centroide por célula). A grade começa fina e dobra de tamanho
+    até caber em MAX_BINS células, então o número de elementos no mapa não depende
+    da quantidade de pedidos. O HTML gerado fica em um cache LRU pela chave dos
+    filtros ativos, limitado pelo tamanho total do HTML (CURRY_MAP_CACHE_MB,
+    padrão 32 MiB).
+
+    O folium só é importado quando um mapa precisa ser montado: as páginas que
+    importam este módulo não pagam a importação enquanto a visão do mapa não é
+    aberta.
+'''
+
+import os
+
+import numpy as np
+
+from curry.figcache import SizedCache
+
+
+# Número máximo de células (círculos) desenhadas no mapa
+MAX_BINS = 400
+
+# Tamanho inicial da célula da grade, em graus
+CELL_DEGREES = 0.01
+
+# Mapas renderizados, pelo tamanho do HTML
+html_cache = SizedCache(int(float(os.environ.get('CURRY_MAP_CACHE_MB', 32)) * 2 ** 20), len)
+
+
+def grid_bins(df1, max_bins=MAX_BINS, cell=CELL_DEGREES):
+    
+    '''
+        Esta função agrega os locais de entrega em células de uma grade.
+        
+        Input: Dataframe, número máximo de células e tamanho inicial da célula
+        Output: Dataframe com latitude/longitude do centroide, 'count' e
+                'median_time' por célula
+    '''
+    
+    # Coordenadas em float64 (no dataframe limpo são float32): o folium só
+    # serializa números do Python e float64
+    df_aux = (df1.loc[:, ['Delivery_location_latitude', 'Delivery_location_longitude', 'Time_taken(min)']]
+                 .astype({'Delivery_location_latitude': 'float64', 'Delivery_location_longitude': 'float64'}))
+    lat = df_aux['Delivery_location_latitude'].to_numpy()
+    lon = df_aux['Delivery_location_longitude'].to_numpy()
+    
+    while True:
+        celula = np.floor(lat / cell).astype('int64') * 1000003 + np.floor(lon / cell).astype('int64')
+        if len(np.unique(celula)) <= max_bins:
+            break
+        cell *= 2
+    
+    bins = (df_aux.groupby(celula)
+                  .agg(latitude=('Delivery_location_latitude', 'mean'),
+                       longitude=('Delivery_location_longitude', 'mean'),
+                       count=('Time_taken(min)', 'size'),
+                       median_time=('Time_taken(min)', 'median'))
+                  .reset_index(drop=True))
+    return bins
+
+
+def build_map(df1):
+    
+    '''
+        Esta função monta o mapa folium: a localização central de cada cidade
+        por tipo de tráfego (marcadores), as células da grade (círculos com
+        contagem e tempo mediano) e um mapa de calor das mesmas células.
+    '''
+    
+    import folium
+    from folium.plugins import HeatMap
+    
+    centrais = (df1.loc[:, ['City', 'Road_traffic_density', 'Delivery_location_latitude', 'Delivery_location_longitude']]
+                   .groupby(['City', 'Road_traffic_density'], observed=True)
+                   .median()
+                   .astype('float64')
+                   .reset_index())
+    bins = grid_bins(df1)
+    
+    map = folium.Map()
+    if len(bins):
+        map.fit_bounds([[bins['latitude'].min(), bins['longitude'].min()],
+                        [bins['latitude'].max(), bins['longitude'].max()]])
+    
+    camada_centrais = folium.FeatureGroup(name='Localização central', show=True)
+    for cidade, transito, latitude, longitude in centrais.itertuples(index=False):
+        folium.Marker([latitude, longitude], popup='{} - {}'.format(cidade, transito)).add_to(camada_centrais)
+    
+    camada_grade = folium.FeatureGroup(name='Entregas (grade)', show=True)
+    maior = bins['count'].max() if len(bins) else 1
+    for latitude, longitude, n, mediana in bins.itertuples(index=False):
+        folium.CircleMarker([latitude, longitude],
+                            radius=3 + 12 * np.sqrt(n / maior),
+                            weight=1, fill=True, fill_opacity=0.6,
+                            popup='{} pedidos - tempo mediano {:.0f} min'.format(n, mediana)).add_to(camada_grade)
+    
+    camada_calor = folium.FeatureGroup(name='Mapa de calor', show=False)
+    HeatMap(bins[['latitude', 'longitude', 'count']].to_numpy().tolist()).add_to(camada_calor)
+    
+    for camada in (camada_centrais, camada_grade, camada_calor):
+        camada.add_to(map)
+    folium.LayerControl().add_to(map)
+    
+    return map
+
+
+def map_html(key, frame, height=600):
+    
+    '''
+        Esta função retorna o HTML do mapa, reaproveitando o cache quando a
+        mesma chave de filtros (incluindo a versão do dataset) já foi
+        renderizada.
+        
+        Input: Chave dos filtros e função sem argumentos que retorna o
+               dataframe filtrado (chamada apenas quando o mapa não está no
+               cache)
+        Output: HTML do mapa
+    '''
+    
+    def build():
+        import folium
+        return folium.Figure(height=height).add_child(build_map(frame())).render()
+    
+    return html_cache.get_or_build(key, build)
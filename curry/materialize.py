@@ -0,0 +1,551 @@
+#================================================================================
+#==========        Materialização dos KPIs
+#================================================================================
+
+'''
+    Pré-cálculo dos KPIs agregados para todas as combinações de filtros.
+    
+    Uso:
+        python -m curry.materialize [--dataset dataset/train.csv] [--full]
+    
+    O espaço de filtros do modo "Data limite" é pequeno e fixo: subconjuntos
+    dos 4 níveis de trânsito, subconjuntos das 6 condições climáticas (ou
+    todos os valores, quando a página não filtra o clima) e a data limite, um
+    dia entre a primeira e a última data do dataset. Para cada KPI agregado de
+    curry.kpis o job calcula todas as combinações de uma vez a partir do cubo
+    diário: somas acumuladas por data e, para cada subconjunto, a soma das
+    células dos níveis escolhidos (produto pelas matrizes de pertinência).
+    Os entregadores distintos vêm da união (máximo) dos registradores
+    HyperLogLog.
+    
+    O resultado fica em <dataset>_kpis/: um Parquet por KPI com as colunas
+    cutoff, traffic_mask, weather_mask e as colunas do próprio KPI, e um
+    manifest.json com a versão do dataset e a impressão digital de cada data.
+    Na execução seguinte só as datas limite a partir da primeira data alterada
+    são recalculadas.
+    
+    curry.kpis.compute() lê o store quando ele corresponde à versão atual do
+    dataset e os filtros estão no espaço materializado. Intervalos de datas,
+    contagens exatas e as tabelas por entregador ou por restaurante
+    (top_couriers, ratings_by_courier, restaurant_radius, ...) continuam sendo
+    calculados na hora.
+'''
+
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from curry.cube import load_cube, moments
+from curry.data import DATASET_PATH, calendar_table, dataset_version, date_keys, file_signature, join_calendar
+from curry.sketches import hll_estimate, load_sketches
+
+
+STORE_VERSION = '2'
+
+# Valores oferecidos pelos filtros da barra lateral. Os bits de cada máscara
+# seguem a ordem das listas; o bit seguinte reúne os demais valores e só
+# entra na máscara "todos" (filtro não aplicado)
+TRAFFIC_LEVELS = ['Low', 'Medium', 'High', 'Jam']
+WEATHER_CONDITIONS = ['conditions Cloudy', 'conditions Fog', 'conditions Sunny',
+                      'conditions Stormy', 'conditions Sandstorms', 'conditions Windy']
+
+TRAFFIC_ALL = (1 << (len(TRAFFIC_LEVELS) + 1)) - 1
+WEATHER_ALL = (1 << (len(WEATHER_CONDITIONS) + 1)) - 1
+
+TRAFFIC_MASKS = list(range(1 << len(TRAFFIC_LEVELS))) + [TRAFFIC_ALL]
+WEATHER_MASKS = list(range(1 << len(WEATHER_CONDITIONS))) + [WEATHER_ALL]
+
+
+def time_columns(s):
+    return {'avg_time': s['time_mean'], 'std_time': s['time_std']}
+
+
+# KPIs acumulados até a data limite: (dimensões, medidas, colunas de saída a
+# partir de 'count', 'm_mean' e 'm_std'). Sem dimensões o KPI é um número,
+# guardado na coluna 'value'.
+CUMULATIVE_KPIS = {
+    'orders_by_week': (['year_week'], (), lambda s: {'orders': s['count']}),
+    'traffic_order_share': (['Road_traffic_density'], (),
+                            lambda s: {'orders': s['count'], 'share': s['count'] / s['count'].sum(axis=-1, keepdims=True)}),
+    'traffic_order_city': (['City', 'Road_traffic_density'], (), lambda s: {'orders': s['count']}),
+    'ratings_by_traffic': (['Road_traffic_density'], ('rating',),
+                           lambda s: {'delivery_mean': s['rating_mean'], 'delivery_std': s['rating_std']}),
+    'ratings_by_weather': (['Weatherconditions'], ('rating',),
+                           lambda s: {'clima_mean': s['rating_mean'], 'clima_std': s['rating_std']}),
+    'avg_distance': ([], ('distance',), lambda s: {'value': np.round(s['distance_mean'], 2)}),
+    'distance_by_city': (['City'], ('distance',), lambda s: {'distance': s['distance_mean']}),
+    'delivery_time_by_festival': (['Festival'], ('time',), time_columns),
+    'delivery_time_by_city': (['City'], ('time',), time_columns),
+    'delivery_time_by_city_traffic': (['City', 'Road_traffic_density'], ('time',), time_columns),
+    'delivery_time_by_city_order_type': (['City', 'Type_of_order'], ('time',), time_columns),
+}
+
+# KPIs por dia: cada data limite é um recorte das linhas até ela
+DAILY_KPIS = ['orders_by_day']
+
+SKETCH_KPIS = ['unique_couriers']
+
+#================================================================================
+#==========        Máscaras dos filtros
+#================================================================================
+
+def selection_mask(valores, niveis, todos):
+    
+    '''
+        Esta função converte a seleção de um filtro na máscara de bits
+        materializada, ou None se algum valor está fora da lista de níveis.
+    '''
+    
+    if valores is None:
+        return todos
+    mascara = 0
+    for valor in valores:
+        if valor not in niveis:
+            return None
+        mascara |= 1 << niveis.index(valor)
+    return mascara
+
+
+def membership(mascaras, n_bits):
+    
+    '''
+        Esta função retorna a matriz (máscaras x bits) de pertinência.
+    '''
+    
+    mascaras = np.asarray(mascaras)
+    return ((mascaras[:, None] >> np.arange(n_bits)) & 1).astype('float64')
+
+
+def bucket_codes(valores, niveis):
+    
+    '''
+        Esta função retorna a posição de cada valor na lista de níveis, com
+        os valores fora da lista no balde seguinte.
+    '''
+    
+    codes = pd.Categorical(valores, categories=niveis).codes.astype('int64')
+    return np.where(codes < 0, len(niveis), codes)
+
+
+#================================================================================
+#==========        Cálculo
+#================================================================================
+
+def cube_cells(cube, cutoffs):
+    
+    '''
+        Esta função prepara as células do cubo para a materialização: posição
+        da data entre as datas limite, baldes de trânsito e clima e a semana
+        do ano (year_week, da dimensão calendário).
+    '''
+    
+    chaves = date_keys(cube['Order_Date'])
+    cells = cube.assign(year_week=join_calendar(calendar_table(cube['Order_Date']), chaves, 'year_week'))
+    cells['date_code'] = np.searchsorted(cutoffs.to_numpy(), cube['Order_Date'].to_numpy())
+    cells['traffic_code'] = bucket_codes(cube['Road_traffic_density'], TRAFFIC_LEVELS)
+    cells['weather_code'] = bucket_codes(cube['Weatherconditions'], WEATHER_CONDITIONS)
+    return cells
+
+
+def combine(arr):
+    
+    '''
+        Esta função soma, para cada par de máscaras, as fatias de arr
+        (datas x trânsito x clima x ...) dos níveis escolhidos.
+        
+        Output: Array (datas x máscaras de trânsito x máscaras de clima x ...)
+    '''
+    
+    T = membership(TRAFFIC_MASKS, len(TRAFFIC_LEVELS) + 1)
+    W = membership(WEATHER_MASKS, len(WEATHER_CONDITIONS) + 1)
+    return np.einsum('st,wv,dtv...->dsw...', T, W, arr, optimize=True)
+
+
+def key_frame(cutoffs, shape):
+    
+    '''
+        Esta função retorna as colunas de chave de um array (datas x máscaras
+        de trânsito x máscaras de clima x grupos) achatado.
+    '''
+    
+    d, s, w, g = np.indices(shape).reshape(4, -1)
+    return pd.DataFrame({'cutoff': cutoffs.to_numpy()[d],
+                         'traffic_mask': np.asarray(TRAFFIC_MASKS, dtype='int8')[s],
+                         'weather_mask': np.asarray(WEATHER_MASKS, dtype='int8')[w]}), g
+
+
+def cumulative_kpi(cells, cutoffs, first, by, measures, output):
+    
+    '''
+        Esta função materializa um KPI acumulado para as datas limite a partir
+        da posição first.
+    '''
+    
+    if by:
+        grupos = cells.groupby(by, sort=True, observed=True)
+        labels = grupos.size().reset_index()[by]
+        # No pandas 1.5 observed=True ignora sort=True em colunas categóricas:
+        # os grupos são reordenados aqui para manter a ordem das páginas
+        ordem = labels.sort_values(by, kind='stable').index.to_numpy()
+        posicao = np.empty(len(ordem), dtype='int64')
+        posicao[ordem] = np.arange(len(ordem))
+        group_code = posicao[grupos.ngroup().to_numpy()]
+        labels = labels.iloc[ordem].reset_index(drop=True)
+    else:
+        group_code = np.zeros(len(cells), dtype='int64')
+        labels = pd.DataFrame(index=[0])
+    
+    colunas = ['count'] + [m + sufixo for m in measures for sufixo in ('_n', '_sum', '_sumsq')]
+    shape = (len(cutoffs), len(TRAFFIC_LEVELS) + 1, len(WEATHER_CONDITIONS) + 1, len(labels), len(colunas))
+    arr = np.zeros(shape)
+    np.add.at(arr, (cells['date_code'].to_numpy(), cells['traffic_code'].to_numpy(),
+                    cells['weather_code'].to_numpy(), group_code), cells[colunas].to_numpy(dtype='float64'))
+    
+    totais = combine(np.cumsum(arr, axis=0)[first:])
+    
+    stats = {'count': np.round(totais[..., 0]).astype('int64')}
+    for i, m in enumerate(measures):
+        n, soma, soma_quadrados = (totais[..., 1 + 3 * i + j] for j in range(3))
+        stats[m + '_mean'], stats[m + '_std'] = moments(n, soma, soma_quadrados)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        saida = output(stats)
+    chaves, g = key_frame(cutoffs[first:], stats['count'].shape)
+    df_aux = pd.concat([chaves, labels.iloc[g].reset_index(drop=True)], axis=1) if by else chaves
+    for nome, valores in saida.items():
+        df_aux[nome] = valores.reshape(-1)
+    
+    # Como no cubo filtrado, só os grupos com pedidos (KPIs escalares ficam
+    # com uma linha por combinação, mesmo vazia)
+    if by:
+        df_aux = df_aux.loc[stats['count'].reshape(-1) > 0]
+    return df_aux.reset_index(drop=True)
+
+
+def daily_kpi(cells, cutoffs, datas):
+    
+    '''
+        Esta função materializa os pedidos por dia das datas nas posições
+        datas.
+    '''
+    
+    shape = (len(cutoffs), len(TRAFFIC_LEVELS) + 1, len(WEATHER_CONDITIONS) + 1)
+    arr = np.zeros(shape)
+    np.add.at(arr, (cells['date_code'].to_numpy(), cells['traffic_code'].to_numpy(),
+                    cells['weather_code'].to_numpy()), cells['count'].to_numpy(dtype='float64'))
+    
+    pedidos = np.round(combine(arr[datas])).astype('int64')[..., None]
+    df_aux, _ = key_frame(cutoffs[datas], pedidos.shape)
+    df_aux = df_aux.rename(columns={'cutoff': 'Order_Date'})
+    df_aux['orders'] = pedidos.reshape(-1)
+    return df_aux.loc[df_aux['orders'] > 0].reset_index(drop=True)
+
+
+def sketch_kpi(sketches, cutoffs, first):
+    
+    '''
+        Esta função materializa os entregadores distintos (HyperLogLog) para
+        as datas limite a partir da posição first.
+    '''
+    
+    cells = sketches.cells
+    date_code = np.searchsorted(cutoffs.to_numpy(), cells['Order_Date'].to_numpy())
+    traffic_code = bucket_codes(cells['Road_traffic_density'], TRAFFIC_LEVELS)
+    weather_code = bucket_codes(cells['Weatherconditions'], WEATHER_CONDITIONS)
+    
+    # Registradores acumulados por data para cada par (trânsito, clima)
+    m = sketches.registers.shape[1]
+    pares = np.zeros((len(cutoffs), len(TRAFFIC_LEVELS) + 1, len(WEATHER_CONDITIONS) + 1, m), dtype='uint8')
+    np.maximum.at(pares, (date_code, traffic_code, weather_code), sketches.registers)
+    pares = np.maximum.accumulate(pares, axis=0)[first:]
+    
+    estimativas = np.zeros((len(pares), len(TRAFFIC_MASKS), len(WEATHER_MASKS)), dtype='int64')
+    for i, ti in enumerate(TRAFFIC_MASKS):
+        bits_t = [t for t in range(len(TRAFFIC_LEVELS) + 1) if ti >> t & 1]
+        por_clima = pares[:, bits_t].max(axis=1) if bits_t else np.zeros_like(pares[:, 0])
+        for j, wj in enumerate(WEATHER_MASKS):
+            bits_w = [w for w in range(len(WEATHER_CONDITIONS) + 1) if wj >> w & 1]
+            if bits_t and bits_w:
+                estimativas[:, i, j] = np.round(hll_estimate(por_clima[:, bits_w].max(axis=1)))
+    
+    df_aux, _ = key_frame(cutoffs[first:], estimativas[..., None].shape)
+    df_aux['value'] = estimativas.reshape(-1)
+    return df_aux
+
+
+#================================================================================
+#==========        Store em disco
+#================================================================================
+
+def store_path(path=DATASET_PATH):
+    
+    '''
+        Esta função retorna o diretório do store de KPIs do dataset.
+    '''
+    
+    return os.path.splitext(path)[0] + '_kpis'
+
+
+def date_fingerprints(cube, sketches):
+    
+    '''
+        Esta função retorna uma impressão digital por data (células do cubo e
+        registradores dos sketches), para detectar as datas alteradas.
+    '''
+    
+    hash_cube = pd.util.hash_pandas_object(cube, index=False).to_numpy()
+    registradores = np.ascontiguousarray(sketches.registers).view('uint64')
+    hash_sketches = pd.util.hash_array(registradores.ravel()).reshape(registradores.shape).sum(axis=1)
+    
+    impressoes = {}
+    for datas, hashes in ((cube['Order_Date'], hash_cube), (sketches.cells['Order_Date'], hash_sketches)):
+        for data, valor in pd.Series(hashes).groupby(datas.to_numpy()).sum().items():
+            chave = data.strftime('%Y-%m-%d')
+            impressoes[chave] = (impressoes.get(chave, 0) + int(valor)) % 2 ** 64
+    return {data: '{:016x}'.format(valor) for data, valor in sorted(impressoes.items())}
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_atomic(path, writer):
+    tmp = path + '.tmp'
+    writer(tmp)
+    os.replace(tmp, path)
+
+
+def write_table(path, df_aux):
+    write_atomic(path, lambda tmp: pq.write_table(pa.Table.from_pandas(df_aux, preserve_index=False), tmp, compression='zstd'))
+
+
+def write_manifest(directory, manifest):
+    def writer(tmp):
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=1)
+    write_atomic(os.path.join(directory, 'manifest.json'), writer)
+
+
+def materialize(path=DATASET_PATH, full=False):
+    
+    '''
+        Esta função atualiza o store de KPIs do dataset, recalculando apenas
+        as datas limite a partir da primeira data alterada e os dias
+        alterados (ou tudo, com full=True ou sem store compatível).
+        
+        Output: Dicionário com o resumo da execução
+    '''
+    
+    inicio = time.perf_counter()
+    directory = store_path(path)
+    os.makedirs(directory, exist_ok=True)
+    
+    cube = load_cube(path)
+    sketches = load_sketches(path)
+    cutoffs = pd.date_range(cube['Order_Date'].min(), cube['Order_Date'].max(), freq='D')
+    datas = list(cutoffs.strftime('%Y-%m-%d'))
+    impressoes = date_fingerprints(cube, sketches)
+    nomes = list(CUMULATIVE_KPIS) + DAILY_KPIS + SKETCH_KPIS
+    
+    anterior = None if full else read_manifest(directory)
+    compativel = (anterior is not None and anterior.get('store_version') == STORE_VERSION
+                  and anterior.get('first_cutoff') == datas[0]
+                  and all(os.path.exists(os.path.join(directory, nome + '.parquet')) for nome in nomes))
+    
+    # Datas com pedidos novos, alterados ou removidos
+    if compativel:
+        antigas = anterior['fingerprints']
+        alteradas = sorted(data for data in set(antigas) | set(impressoes) if antigas.get(data) != impressoes.get(data))
+    else:
+        alteradas = datas
+    
+    # Os KPIs acumulados mudam em todas as datas limite a partir da primeira
+    # data alterada; os diários, só nos dias alterados
+    first = int(np.searchsorted(np.array(datas), alteradas[0])) if alteradas else len(datas)
+    dias = [i for i, data in enumerate(datas) if data in set(alteradas)]
+    corte = pd.Timestamp(alteradas[0]) if alteradas else None
+    
+    def merge(nome, novo, coluna, manter):
+        arquivo = os.path.join(directory, nome + '.parquet')
+        if compativel:
+            velho = pd.read_parquet(arquivo)
+            novo = pd.concat([velho.loc[manter(velho[coluna])], novo], ignore_index=True)
+        write_table(arquivo, novo.sort_values([coluna, 'traffic_mask', 'weather_mask'], kind='stable')
+                                 .reset_index(drop=True))
+    
+    if alteradas:
+        cells = cube_cells(cube, cutoffs)
+        anteriores = lambda col: col < corte
+        
+        for nome, (by, measures, output) in CUMULATIVE_KPIS.items():
+            merge(nome, cumulative_kpi(cells, cutoffs, first, by, measures, output), 'cutoff', anteriores)
+        for nome in SKETCH_KPIS:
+            merge(nome, sketch_kpi(sketches, cutoffs, first), 'cutoff', anteriores)
+        
+        inalterados = lambda col: ~col.isin(pd.to_datetime(alteradas))
+        for nome in DAILY_KPIS:
+            merge(nome, daily_kpi(cells, cutoffs, dias), 'Order_Date', inalterados)
+    
+    write_manifest(directory, {
+        'store_version': STORE_VERSION,
+        'dataset_version': dataset_version(path),
+        'first_cutoff': datas[0],
+        'last_cutoff': datas[-1],
+        'kpis': nomes,
+        'fingerprints': impressoes,
+    })
+    
+    return {'directory': directory, 'cutoffs': len(datas), 'recomputed_cutoffs': len(datas) - first,
+            'recomputed_days': len(dias), 'seconds': time.perf_counter() - inicio}
+
+
+#================================================================================
+#==========        Leitura
+#================================================================================
+
+class KPIStore:
+    
+    '''
+        Store de KPIs materializados em memória. Cada KPI é lido na primeira
+        consulta e fica ordenado pela chave (data, trânsito, clima).
+    '''
+    
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+        self.first_cutoff = pd.Timestamp(manifest['first_cutoff'])
+        self.last_cutoff = pd.Timestamp(manifest['last_cutoff'])
+        self._tables = {}
+        self._lock = threading.Lock()
+    
+    def table(self, nome):
+    
+        '''
+            Esta função retorna (chaves ordenadas, dataframe) do KPI nome.
+        '''
+        
+        tabela = self._tables.get(nome)
+        if tabela is None:
+            with self._lock:
+                tabela = self._tables.get(nome)
+                if tabela is None:
+                    df_aux = pd.read_parquet(os.path.join(self.directory, nome + '.parquet'))
+                    coluna = 'Order_Date' if nome in DAILY_KPIS else 'cutoff'
+                    df_aux = df_aux.sort_values(['traffic_mask', 'weather_mask', coluna], kind='stable').reset_index(drop=True)
+                    chaves = self.key(df_aux['traffic_mask'].to_numpy(), df_aux['weather_mask'].to_numpy(),
+                                      df_aux[coluna].to_numpy())
+                    tabela = (chaves, df_aux.drop(columns=['traffic_mask', 'weather_mask'] + (['cutoff'] if coluna == 'cutoff' else [])))
+                    self._tables[nome] = tabela
+        return tabela
+    
+    def key(self, traffic_mask, weather_mask, data):
+        dias = (np.asarray(data, dtype='datetime64[D]') - np.datetime64(self.first_cutoff.date(), 'D')).astype('int64')
+        return (np.asarray(traffic_mask, dtype='int64') * 256 + np.asarray(weather_mask, dtype='int64')) * 100000 + dias
+    
+    def lookup(self, nome, date_max, traffic, weather):
+    
+        '''
+            Esta função retorna o KPI materializado para os filtros, ou None
+            quando eles estão fora do espaço materializado.
+        '''
+        
+        traffic_mask = selection_mask(traffic, TRAFFIC_LEVELS, TRAFFIC_ALL)
+        weather_mask = selection_mask(weather, WEATHER_CONDITIONS, WEATHER_ALL)
+        if traffic_mask is None or weather_mask is None:
+            return None
+        
+        cutoff = self.last_cutoff if date_max is None else pd.Timestamp(date_max).normalize()
+        if cutoff < self.first_cutoff:
+            return None
+        cutoff = min(cutoff, self.last_cutoff)
+        
+        chaves, df_aux = self.table(nome)
+        if nome in DAILY_KPIS:
+            inicio = np.searchsorted(chaves, self.key(traffic_mask, weather_mask, self.first_cutoff), side='left')
+        else:
+            inicio = np.searchsorted(chaves, self.key(traffic_mask, weather_mask, cutoff), side='left')
+        fim = np.searchsorted(chaves, self.key(traffic_mask, weather_mask, cutoff), side='right')
+        
+        result = df_aux.iloc[inicio:fim].reset_index(drop=True)
+        if 'value' in result.columns:
+            return result['value'].iloc[0] if nome in CUMULATIVE_KPIS else int(result['value'].iloc[0])
+        return result
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def load_store(path=DATASET_PATH):
+    
+    '''
+        Esta função retorna o store de KPIs do dataset, ou None quando ele não
+        existe ou não corresponde à versão atual do dataset.
+    '''
+    
+    global _store
+    
+    arquivo = os.path.join(store_path(path), 'manifest.json')
+    try:
+        signature = file_signature(arquivo)
+    except OSError:
+        return None
+    
+    cached = _store
+    if cached is None or cached[0] != (arquivo, signature):
+        with _store_lock:
+            cached = _store
+            if cached is None or cached[0] != (arquivo, signature):
+                manifest = read_manifest(os.path.dirname(arquivo))
+                store = KPIStore(os.path.dirname(arquivo), manifest) if manifest and manifest.get('store_version') == STORE_VERSION else None
+                cached = _store = ((arquivo, signature), store)
+    
+    store = cached[1]
+    if store is None or store.manifest['dataset_version'] != dataset_version(path):
+        return None
+    return store
+
+
+def materialized(name, date_min=None, date_max=None, traffic=None, weather=None, **params):
+    
+    '''
+        Esta função retorna o KPI name do store materializado, ou None quando
+        ele precisa ser calculado na hora (KPI não materializado, intervalo de
+        datas, parâmetros extras, store ausente ou desatualizado).
+    '''
+    
+    if date_min is not None or params.get('exact') or (params and set(params) != {'exact'}):
+        return None
+    if name not in CUMULATIVE_KPIS and name not in DAILY_KPIS and name not in SKETCH_KPIS:
+        return None
+    
+    store = load_store()
+    if store is None:
+        return None
+    return store.lookup(name, date_max, traffic, weather)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m curry.materialize', description='Materializa os KPIs agregados do painel.')
+    parser.add_argument('--dataset', default=DATASET_PATH, help='CSV (ou Parquet) do dataset')
+    parser.add_argument('--full', action='store_true', help='recalcula todas as datas')
+    args = parser.parse_args(argv)
+    
+    resumo = materialize(args.dataset, full=args.full)
+    print('{directory}: {recomputed_cutoffs} de {cutoffs} datas limite e {recomputed_days} dias recalculados '
+          'em {seconds:.2f}s'.format(**resumo))
+
+
+if __name__ == '__main__':
+    main()
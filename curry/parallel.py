@@ -0,0 +1,45 @@
+#================================================================================
+#==========        Execução paralela das seções de uma página
+#================================================================================
+
+'''
+    Executa em paralelo os cálculos independentes de uma página.
+
+    Cada seção é uma função sem argumentos que apenas lê os dados já filtrados e
+    devolve o resultado (métrica, tabela ou figura); nenhuma chamada st.* deve
+    acontecer dentro delas, pois as threads do pool não têm contexto de sessão.
+    A página desenha os resultados depois, na ordem do layout.
+
+    O pool é de threads, compartilhado pelo processo: pandas e NumPy liberam o
+    GIL nas operações pesadas e o dataframe não precisa ser copiado para outro
+    processo. CURRY_PARALLEL=0 volta para a execução serial.
+'''
+
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+PARALLEL = os.environ.get('CURRY_PARALLEL', '1') != '0'
+
+MAX_WORKERS = int(os.environ.get('CURRY_MAX_WORKERS', min(8, os.cpu_count() or 1)))
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='curry-section')
+
+
+def run_sections(sections, parallel=PARALLEL):
+    
+    '''
+        Esta função calcula as seções e retorna os resultados.
+        
+        Input: Dicionário nome -> função sem argumentos e o modo (paralelo ou
+               serial)
+        Output: Dicionário nome -> resultado
+    '''
+    
+    if not parallel or len(sections) < 2:
+        return {nome: func() for nome, func in sections.items()}
+    
+    # Cada seção roda com o contexto da execução (instrumentação de curry.profiling)
+    futuros = {nome: _executor.submit(contextvars.copy_context().run, func) for nome, func in sections.items()}
+    return {nome: futuro.result() for nome, futuro in futuros.items()}
@@ -0,0 +1,290 @@
+#================================================================================
+#==========        Instrumentação das execuções das páginas
+#================================================================================
+
+'''
+    Instrumentação opcional de cada execução (rerun) das páginas.
+    
+    Ligada com CURRY_PROFILE=1 ou com o parâmetro ?profile=1 na URL. Cada etapa
+    marcada com span() ou @profiled registra tempo de parede, linhas de entrada
+    e de saída e a variação de memória alocada (tracemalloc, que inclui as
+    alocações do NumPy). Os registros aparecem no painel "Desempenho" da barra
+    lateral e são emitidos como linhas JSON no logger 'curry.profile', prontas
+    para o coletor de logs.
+    
+    O profiler ativo fica em uma ContextVar da execução atual. Desligado,
+    span() devolve um contexto vazio compartilhado: o custo é uma leitura da
+    ContextVar por etapa. Em seções paralelas (curry.parallel) a variação de
+    memória de cada etapa inclui as alocações das outras threads.
+'''
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+
+import numpy as np
+import pandas as pd
+
+
+PROFILE_ENV = os.environ.get('CURRY_PROFILE', '0') != '0'
+
+logger = logging.getLogger('curry.profile')
+
+_active = contextvars.ContextVar('curry_profiler', default=None)
+_parent = contextvars.ContextVar('curry_profile_parent', default=None)
+
+# Execuções instrumentadas em andamento (run_id -> início). O tracemalloc fica
+# ligado enquanto houver alguma; execuções interrompidas por um novo rerun não
+# chegam a render_profiler e são descartadas depois de STALE_SECONDS.
+STALE_SECONDS = 300
+
+_running = {}
+_owns_tracing = False
+_tracing_lock = threading.Lock()
+
+
+class _NullSpan:
+    
+    '''
+        Contexto vazio usado quando a instrumentação está desligada.
+    '''
+    
+    rows_out = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def row_count(value):
+    
+    '''
+        Esta função retorna o número de linhas de um dataframe, série ou
+        array, e None para os demais valores (figuras, métricas, ...).
+    '''
+    
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(value)
+    return None
+
+
+class Span:
+    
+    '''
+        Uma etapa medida. rows_out pode ser definido dentro do bloco.
+    '''
+    
+    def __init__(self, profiler, name, rows_in=None):
+        self.profiler = profiler
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+    
+    def __enter__(self):
+        self._token = _parent.set(self.name)
+        self._memory = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        memory_delta = tracemalloc.get_traced_memory()[0] - self._memory
+        _parent.reset(self._token)
+        self.profiler.record({
+            'step': self.name,
+            'parent': _parent.get(),
+            'seconds': round(seconds, 6),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'memory_delta': memory_delta if tracemalloc.is_tracing() else None,
+            'thread': threading.current_thread().name,
+            'error': exc_type.__name__ if exc_type is not None else None,
+        })
+        return False
+
+
+class Profiler:
+    
+    '''
+        Registros de uma execução de página.
+    '''
+    
+    def __init__(self, page):
+        self.page = page
+        self.run_id = uuid.uuid4().hex[:12]
+        self.records = []
+        self.start = time.perf_counter()
+    
+    def span(self, name, rows_in=None):
+        return Span(self, name, rows_in)
+    
+    def record(self, registro):
+        registro = dict(registro, page=self.page, run_id=self.run_id)
+        # list.append é atômico: seções paralelas podem registrar ao mesmo tempo
+        self.records.append(registro)
+        logger.info(json.dumps(registro, default=str))
+    
+    def frame(self):
+        colunas = ['step', 'parent', 'seconds', 'rows_in', 'rows_out', 'memory_delta', 'thread', 'error']
+        return pd.DataFrame(self.records, columns=colunas)
+
+
+def span(name, rows_in=None):
+    
+    '''
+        Esta função retorna o contexto que mede a etapa name na execução atual
+        (ou um contexto vazio quando a instrumentação está desligada).
+        
+        Uso:
+            with span('filtro', rows_in=len(df1)) as etapa:
+                df1 = ...
+                etapa.rows_out = len(df1)
+    '''
+    
+    profiler = _active.get()
+    if profiler is None:
+        return _NULL_SPAN
+    return profiler.span(name, rows_in)
+
+
+def profiled(func=None, name=None):
+    
+    '''
+        Decorador que mede cada chamada da função como uma etapa. As linhas de
+        entrada vêm do primeiro argumento e as de saída do resultado, quando
+        são dataframes, séries ou arrays.
+    '''
+    
+    if func is None:
+        return functools.partial(profiled, name=name)
+    
+    nome = name or func.__name__
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _active.get()
+        if profiler is None:
+            return func(*args, **kwargs)
+        with profiler.span(nome, row_count(args[0]) if args else None) as etapa:
+            result = func(*args, **kwargs)
+            etapa.rows_out = row_count(result)
+        return result
+    
+    return wrapper
+
+
+def profile_requested():
+    
+    '''
+        Esta função indica se a instrumentação foi pedida pela variável de
+        ambiente ou pelo parâmetro profile=1 da URL.
+    '''
+    
+    if PROFILE_ENV:
+        return True
+    
+    import streamlit as st
+    return st.experimental_get_query_params().get('profile', ['0'])[0] not in ('', '0')
+
+
+def configure_logger():
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def start_profiler(page):
+    
+    '''
+        Esta função inicia a instrumentação da execução atual da página, se
+        ela foi pedida, e retorna o profiler (ou None).
+        
+        Deve ser chamada no início da página, logo após st.set_page_config; o
+        painel é desenhado por render_profiler() no fim da página.
+    '''
+    
+    global _owns_tracing
+    
+    if not profile_requested():
+        _active.set(None)
+        if _running:
+            release_tracing()
+        return None
+    
+    configure_logger()
+    profiler = Profiler(page)
+    with _tracing_lock:
+        _running[profiler.run_id] = profiler.start
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _owns_tracing = True
+    
+    _active.set(profiler)
+    return profiler
+
+
+def release_tracing(run_id=None):
+    
+    '''
+        Esta função remove a execução run_id (e as abandonadas) da lista de
+        execuções instrumentadas e desliga o tracemalloc quando não resta
+        nenhuma.
+    '''
+    
+    global _owns_tracing
+    
+    with _tracing_lock:
+        _running.pop(run_id, None)
+        agora = time.perf_counter()
+        for chave, inicio in list(_running.items()):
+            if agora - inicio > STALE_SECONDS:
+                del _running[chave]
+        if not _running and _owns_tracing:
+            tracemalloc.stop()
+            _owns_tracing = False
+
+
+def render_profiler(profiler):
+    
+    '''
+        Esta função encerra a instrumentação da execução e desenha o painel
+        "Desempenho" na barra lateral, com as etapas medidas e o estado do
+        cache de figuras.
+    '''
+    
+    if profiler is None:
+        return
+    
+    import streamlit as st
+    from curry.figcache import figure_cache
+    
+    total = time.perf_counter() - profiler.start
+    _active.set(None)
+    release_tracing(profiler.run_id)
+    profiler.record({'step': 'rerun', 'parent': None, 'seconds': round(total, 6)})
+    
+    with st.sidebar.expander('Desempenho', expanded=False):
+        st.caption('Execução {} em {:.3f}s'.format(profiler.run_id, total))
+        df_aux = profiler.frame()
+        df_aux['memory_delta'] = df_aux['memory_delta'] / 2 ** 20
+        st.dataframe(df_aux.rename(columns={'memory_delta': 'memory_delta_mib'}))
+        st.markdown('##### Cache de figuras')
+        st.json(figure_cache.stats())
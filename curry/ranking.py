@@ -0,0 +1,54 @@
+#================================================================================
+#==========        Ranking parcial (top-k / bottom-k) por grupo
+#================================================================================
+
+import numpy as np
+
+
+def top_bottom_k(df_aux, group_col, value_col, k=10):
+    
+    '''
+        Esta função seleciona, para cada grupo, as k linhas de menor e de maior
+        valor sem ordenar o grupo inteiro.
+
+        Uma única chamada de np.argpartition por grupo separa as duas pontas
+        (k menores no início, k maiores no final); apenas essas 2k linhas são
+        ordenadas depois. Os grupos são todos os valores presentes em group_col,
+        em ordem crescente.
+        
+        Input: Dataframe, coluna de grupo, coluna de valor e k (>= 1)
+        Output: (menores, maiores) - dataframes com até k linhas por grupo,
+                ordenados do menor para o maior e do maior para o menor;
+                ValueError se k < 1
+    '''
+    
+    if k < 1:
+        raise ValueError('k deve ser pelo menos 1: {}'.format(k))
+    
+    valores = df_aux[value_col].to_numpy()
+    menores, maiores = [], []
+    
+    # Ordenação explícita: no pandas 1.5 observed=True ignora sort=True em
+    # colunas categóricas
+    grupos = df_aux.groupby(group_col, sort=True, observed=True).indices
+    for _, posicoes in sorted(grupos.items(), key=lambda item: item[0]):
+        v = valores[posicoes]
+        n = len(v)
+        
+        if n > 2 * k:
+            particao = np.argpartition(v, [k - 1, n - k])
+            baixo, alto = particao[:k], particao[n - k:]
+        else:
+            baixo = alto = np.arange(n)
+        
+        baixo = baixo[np.argsort(v[baixo], kind='stable')][:k]
+        alto = alto[np.argsort(-v[alto], kind='stable')][:k]
+        menores.append(posicoes[baixo])
+        maiores.append(posicoes[alto])
+    
+    if not menores:
+        vazio = df_aux.iloc[:0]
+        return vazio, vazio
+    
+    return (df_aux.iloc[np.concatenate(menores)].reset_index(drop=True),
+            df_aux.iloc[np.concatenate(maiores)].reset_index(drop=True))
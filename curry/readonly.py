@@ -0,0 +1,131 @@
+#================================================================================
+#==========        Dataframes compartilhados somente leitura
+#================================================================================
+
+'''
+    Proteção dos dataframes compartilhados entre sessões, páginas e a API.
+    
+    O dataframe limpo (load_data) é um só por processo e as páginas recebem a
+    própria instância, sem cópia. freeze() marca os arrays dele como somente
+    leitura: uma escrita direta nos valores (df1.loc[...] = ..., .to_numpy()
+    alterado no lugar) falha com ValueError em vez de alterar os dados de
+    todas as sessões.
+    
+    Com CURRY_ASSERT_READONLY=1 (modo de teste) os valores compartilhados
+    também recebem uma impressão digital (colunas, tipos e hash das linhas)
+    quando entram no cache, conferida a cada nova entrega: uma coluna
+    adicionada, removida ou substituída no dataframe compartilhado ou em um
+    resultado de KPI em cache dispara SharedFrameWriteError. A conferência
+    custa um hash do dataframe por chamada e fica desligada em produção.
+'''
+
+import os
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+
+ASSERT_READONLY = os.environ.get('CURRY_ASSERT_READONLY', '0') != '0'
+
+# id do valor -> (referência, impressão digital). Dataframes ficam com
+# referência fraca; dicionários (que não aceitam) ficam com referência forte
+# enquanto o modo de teste estiver ligado.
+_guarded = {}
+_guarded_lock = threading.Lock()
+
+
+class SharedFrameWriteError(AssertionError):
+    
+    '''
+        Um valor compartilhado foi alterado depois de entregue.
+    '''
+
+
+def block_arrays(df1):
+    
+    '''
+        Esta função retorna os arrays NumPy que guardam os valores do
+        dataframe: os blocos numéricos, os códigos das categóricas e os
+        valores das datas.
+    '''
+    
+    arrays = []
+    for valores in df1._mgr.arrays:
+        if isinstance(valores, np.ndarray):
+            arrays.append(valores)
+        elif isinstance(getattr(valores, '_ndarray', None), np.ndarray):
+            # Categorical (códigos) e DatetimeArray
+            arrays.append(valores._ndarray)
+    return arrays
+
+
+def freeze(df1):
+    
+    '''
+        Esta função marca os valores do dataframe como somente leitura, no
+        lugar, e retorna o próprio dataframe. Operações que geram um novo
+        dataframe (filtros, groupby, assign, copy) continuam funcionando.
+    '''
+    
+    for valores in block_arrays(df1):
+        valores.flags.writeable = False
+    return df1
+
+
+def fingerprint(value):
+    
+    '''
+        Esta função resume um valor compartilhado: colunas, tipos e hash das
+        linhas para dataframes (e séries), recursivamente para dicionários e
+        a representação do valor para os demais (NaN não é igual a si mesmo).
+    '''
+    
+    if isinstance(value, pd.DataFrame):
+        return (tuple(value.columns), tuple(map(str, value.dtypes)),
+                int(pd.util.hash_pandas_object(value, index=True).sum()))
+    if isinstance(value, pd.Series):
+        return (value.name, str(value.dtype), int(pd.util.hash_pandas_object(value, index=True).sum()))
+    if isinstance(value, dict):
+        return tuple((chave, fingerprint(valor)) for chave, valor in value.items())
+    return repr(value)
+
+
+def guard(value):
+    
+    '''
+        Esta função registra a impressão digital de um valor que vai ser
+        compartilhado (apenas no modo de teste) e retorna o próprio valor.
+    '''
+    
+    if not ASSERT_READONLY:
+        return value
+    
+    chave = id(value)
+    try:
+        referencia = weakref.ref(value, lambda _: _guarded.pop(chave, None))
+    except TypeError:
+        referencia = lambda value=value: value
+    with _guarded_lock:
+        _guarded[chave] = (referencia, fingerprint(value))
+    return value
+
+
+def check(value, name='valor compartilhado'):
+    
+    '''
+        Esta função confere, no modo de teste, se o valor registrado por
+        guard() continua igual, e retorna o próprio valor.
+        
+        Input: Valor e nome usado na mensagem de erro
+        Output: O valor; SharedFrameWriteError se ele foi alterado
+    '''
+    
+    if not ASSERT_READONLY:
+        return value
+    
+    registro = _guarded.get(id(value))
+    if registro is not None and registro[0]() is value and fingerprint(value) != registro[1]:
+        raise SharedFrameWriteError('{} foi alterado depois de compartilhado'.format(name))
+    return value
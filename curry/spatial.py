@@ -0,0 +1,144 @@
+#================================================================================
+#==========        Índice espacial em grade
+#================================================================================
+
+'''
+    Índice espacial em grade uniforme sobre os locais de entrega.
+
+    As linhas do dataset são ordenadas pela célula da grade (CELL_DEGREES graus)
+    e cada célula guarda o intervalo de posições correspondente. Uma consulta por
+    raio visita apenas as células que cruzam o retângulo envolvente do círculo e
+    calcula a distância exata (haversine) só para esses candidatos.
+'''
+
+import numpy as np
+import pandas as pd
+
+from curry.data import DATASET_PATH, EARTH_RADIUS_KM, haversine_distance, load_data, load_derived, widen
+from curry.profiling import profiled
+
+
+# ~5,5 km de lado na latitude
+CELL_DEGREES = 0.05
+
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+
+
+class SpatialGrid:
+    
+    '''
+        Buckets de posições de linhas por célula da grade.
+    '''
+    
+    def __init__(self, latitude, longitude, cell=CELL_DEGREES):
+        self.cell = cell
+        self.latitude = np.asarray(latitude, dtype='float64')
+        self.longitude = np.asarray(longitude, dtype='float64')
+        
+        ix, iy = self.cell_of(self.latitude, self.longitude)
+        chaves = self.key(ix, iy)
+        
+        # Posições ordenadas por célula; cada célula é um intervalo [inicio, fim)
+        self.order = np.argsort(chaves, kind='stable')
+        self.keys, self.starts = np.unique(chaves[self.order], return_index=True)
+        self.ends = np.r_[self.starts[1:], len(self.order)]
+    
+    def cell_of(self, latitude, longitude):
+        return (np.floor(np.asarray(latitude) / self.cell).astype('int64'),
+                np.floor(np.asarray(longitude) / self.cell).astype('int64'))
+    
+    @staticmethod
+    def key(ix, iy):
+        return ix * 100000 + iy
+    
+    def candidates(self, latitude, longitude, radius_km):
+        
+        '''
+            Esta função retorna as posições das linhas nas células que cruzam o
+            retângulo envolvente do círculo.
+        '''
+        
+        delta_lat = radius_km / KM_PER_DEGREE
+        delta_lon = radius_km / (KM_PER_DEGREE * max(np.cos(np.radians(latitude)), 1e-6))
+        
+        x0, y0 = self.cell_of(latitude - delta_lat, longitude - delta_lon)
+        x1, y1 = self.cell_of(latitude + delta_lat, longitude + delta_lon)
+        
+        xs, ys = np.meshgrid(np.arange(x0, x1 + 1), np.arange(y0, y1 + 1), indexing='ij')
+        chaves = self.key(xs.ravel(), ys.ravel())
+        
+        i = np.searchsorted(self.keys, chaves)
+        encontradas = (i < len(self.keys)) & (self.keys[np.minimum(i, len(self.keys) - 1)] == chaves)
+        blocos = [self.order[self.starts[j]:self.ends[j]] for j in i[encontradas]]
+        
+        return np.concatenate(blocos) if blocos else np.array([], dtype='int64')
+    
+    def within(self, latitude, longitude, radius_km):
+        
+        '''
+            Esta função retorna as posições (ordenadas) das linhas a até
+            radius_km do ponto.
+        '''
+        
+        posicoes = self.candidates(latitude, longitude, radius_km)
+        distancias = haversine_distance(latitude, longitude, self.latitude[posicoes], self.longitude[posicoes])
+        return np.sort(posicoes[distancias <= radius_km])
+
+
+def load_delivery_grid(path=DATASET_PATH):
+    
+    '''
+        Esta função retorna o índice espacial dos locais de entrega do dataset,
+        construído uma vez por processo.
+    '''
+    
+    def builder(p):
+        df1 = load_data(p)
+        return SpatialGrid(df1['Delivery_location_latitude'], df1['Delivery_location_longitude'])
+    
+    return load_derived('delivery_grid', builder, path)
+
+
+@profiled
+def restaurant_radius_stats(df1):
+    
+    '''
+        Esta função calcula, para cada restaurante (par de coordenadas), a
+        quantidade de pedidos e as estatísticas da distância de entrega.
+        
+        Output: Dataframe ordenado pela quantidade de pedidos
+    '''
+    
+    # A distância fica em float32 no layout compacto: as estatísticas são feitas em float64
+    grupos = widen(df1['distance']).groupby([df1['Restaurant_latitude'], df1['Restaurant_longitude']])
+    df_aux = grupos.agg(orders='size', mean_km='mean', median_km='median', max_km='max')
+    # quantile vetorizado do groupby (e não uma lambda por restaurante)
+    df_aux.insert(3, 'p90_km', grupos.quantile(0.9))
+    return (df_aux.reset_index()
+                  .sort_values('orders', ascending=False, kind='stable')
+                  .reset_index(drop=True))
+
+
+@profiled
+def distance_histogram(df1, bins=20):
+    
+    '''
+        Esta função calcula o histograma da distância de entrega por cidade,
+        com os mesmos intervalos para todas as cidades.
+        
+        Output: Dataframe com as colunas 'City', 'distance_km' (início do
+                intervalo) e 'orders'
+    '''
+    
+    distancias = df1['distance'].to_numpy()
+    if not len(distancias):
+        return pd.DataFrame({'City': [], 'distance_km': [], 'orders': []})
+    
+    limites = np.histogram_bin_edges(distancias, bins=bins)
+    partes = []
+    grupos = df1.groupby('City', observed=True)['distance']
+    for cidade, valores in sorted(grupos, key=lambda item: item[0]):
+        contagem, _ = np.histogram(valores.to_numpy(), bins=limites)
+        partes.append(pd.DataFrame({'City': cidade, 'distance_km': np.round(limites[:-1], 2), 'orders': contagem}))
+    
+    return pd.concat(partes, ignore_index=True)
@@ -3,17 +3,25 @@
 
 import streamlit as st
 import pandas as pd
-import numpy as np 
 import plotly.express as px
-import plotly.graph_objects as go
-from haversine import haversine
-import datetime
-from PIL import Image
-import folium
-from streamlit_folium import folium_static
+import streamlit.components.v1 as components
+
+from curry.api import serve_alongside_ui
+from curry.data import dataset_version, load_data
+from curry.figcache import cached_figure
+from curry.filters import date_filter, load_image, view_selector
+from curry.kpis import compute, filter_key, filtered_positions
+from curry.maps import map_html
+from curry.profiling import profiled, render_profiler, span, start_profiler
 
 st.set_page_config(page_title='Visão Empresa', page_icon='📊', layout='wide')
 
+# Instrumentação opcional (CURRY_PROFILE=1 ou ?profile=1 na URL)
+profiler = start_profiler('empresa')
+
+# API dos KPIs no mesmo processo (apenas com CURRY_API_PORT definida)
+serve_alongside_ui()
+
 # Configuração global de visualização
 pd.set_option("display.max_columns", 21)
 
@@ -22,158 +30,79 @@ pd.set_option("display.max_columns", 21)
 #==========        Funções
 #================================================================================
 
-def country_maps(df1):
+@profiled
+def country_maps(key, frame):
     
     '''
         Esta função tem a responsabilidade de gerar o mapa das cidades.
+
+        As entregas são agregadas em uma grade no servidor, então o tamanho do
+        mapa não cresce com o número de pedidos; o HTML fica em cache pela
+        chave dos filtros ativos, e o recorte do dataframe (frame) só é feito
+        quando o mapa não está no cache.
     '''
     
-    df_aux = (df1.loc[:, ['City', 'Road_traffic_density', 'Delivery_location_latitude', 'Delivery_location_longitude']]
-                    .groupby(['City', 'Road_traffic_density'])
-                    .median()
-                    .reset_index())
-    df_aux = df_aux.loc[df_aux['City'] != 'NaN ',:]
-    df_aux = df_aux.loc[df_aux['Road_traffic_density'] != 'NaN',:]
-
-    # Plotando mapa
-    map = folium.Map()
-
-    for index, location_info in df_aux.iterrows():
-        folium.Marker([location_info['Delivery_location_latitude'], location_info['Delivery_location_longitude']], popup=location_info[['City', 'Road_traffic_density']]).add_to(map)
-        
-    folium_static(map, width=1024, height=600)
+    html = map_html(key, frame, height=600)
+    components.html(html, width=1024, height=610)
 
-def order_share_by_week(df1):
+@profiled
+def order_share_by_week(filtros, exact_couriers):
     
     '''
         Esta função tem a responsabilidade de gerar um gráfico de linha, da quantidade de pedidos por semana
+
+        exact_couriers: conta os entregadores distintos nos pedidos; senão usa
+        a estimativa dos sketches.
     '''
     
     # Quantidade de pedidos por semana / Número único de entregadores por semana
-    df_aux01 = df1.loc[:, ['ID', 'week_of_year']].groupby('week_of_year').count().reset_index()
-    df_aux02 = df1.loc[:, ['Delivery_person_ID', 'week_of_year']].groupby('week_of_year').nunique().reset_index()
-    df_aux = pd.merge(df_aux01, df_aux02, how='inner')
-    df_aux['order_by_delivery'] = df_aux['ID'] / df_aux['Delivery_person_ID']
-    fig = px.line(df_aux, x='week_of_year', y='order_by_delivery')
+    df_aux = compute('order_share_by_week', **filtros, exact=exact_couriers)
+    fig = px.line(df_aux, x='year_week', y='order_by_delivery')
+    # year_week (ano * 100 + semana) é rótulo: sem buracos na virada do ano
+    fig.update_xaxes(type='category')
     return fig
 
-def order_by_week(df1):
-    df1['week_of_year'] = df1['Order_Date'].dt.strftime('%U')
-    df_aux = df1.loc[:, ['ID', 'week_of_year']].groupby('week_of_year').count().reset_index()
-    fig = px.line(df_aux, x='week_of_year', y='ID') 
+@profiled
+def order_by_week(filtros):
+    df_aux = compute('orders_by_week', **filtros)
+    fig = px.line(df_aux, x='year_week', y='orders')
+    fig.update_xaxes(type='category')
     return fig
 
-def traffic_order_citty(df1):
-    df_aux = (df1.loc[:, ['ID','City', 'Road_traffic_density']]
-                 .groupby(['City', 'Road_traffic_density'])
-                 .count()
-                 .reset_index())
-    df_aux = df_aux.loc[df_aux['City'] != 'NaN ',:]
-    df_aux = df_aux.loc[df_aux['Road_traffic_density'] != 'NaN',:]
-    fig = px.scatter(df_aux, x='City', y='Road_traffic_density', size='ID', color='City')
+@profiled
+def traffic_order_citty(filtros):
+    df_aux = compute('traffic_order_city', **filtros)
+    fig = px.scatter(df_aux, x='City', y='Road_traffic_density', size='orders', color='City')
     return fig
 
-def traffic_order_share(df1):
-    df_aux = (df1.loc[:, ['ID', 'Road_traffic_density']]
-                 .groupby('Road_traffic_density')
-                 .count()
-                 .reset_index())
-    df_aux = df_aux.loc[df_aux['Road_traffic_density'] != 'NaN', :]
-    df_aux['entregas_perc'] = df_aux['ID'] / df_aux['ID'].sum()
-    fig = px.pie(df_aux, values='entregas_perc', names='Road_traffic_density')
+@profiled
+def traffic_order_share(filtros):
+    df_aux = compute('traffic_order_share', **filtros)
+    fig = px.pie(df_aux, values='share', names='Road_traffic_density')
     
     return fig
 
 
-def order_metric(df1):
-    cols = ['ID', 'Order_Date']
+@profiled
+def order_metric(filtros):
 
-    # Seleção de linhas
-    df_aux = (df1.loc[:, cols]
-                 .groupby('Order_Date')
-                 .count()
-                 .reset_index())
+    # Contagem de pedidos por dia a partir do cubo
+    df_aux = compute('orders_by_day', **filtros)
 
     # Plotando o gráfico em linhas
-    fig = px.bar(df_aux, x='Order_Date', y='ID')
+    fig = px.bar(df_aux, x='Order_Date', y='orders')
 
     return fig
 
 
-def clean_code(df1):
-    
-    ''' 
-        Esta função tem a responsabilidade de limpar o dataframe
-
-        Tipos de Limpeza:
-        1. Remoção dos dados NaN
-        2. Mudança do tipo da coluna de dados
-        3. Remoção dos espaços das variáveis de texto
-        4. Formatação da coluna de data
-        5. Limpeza da coluna de tempo (Remoção do texto da variável numérica)
-        
-        Input: Dataframe
-        Output: Dataframe
-    '''
-    
-    linhas_selecionadas = df['Delivery_person_Age'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :] 
-
-    linhas_selecionadas = df['Road_traffic_density'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :] 
-
-    linhas_selecionadas = df1['multiple_deliveries'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :]
-
-    linhas_selecionadas = df1['City'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :]
-
-    linhas_selecionadas = df1['Festival'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :]
-
-    df1['Delivery_person_Age'] = df1['Delivery_person_Age'].astype(int)
-
-    df1['Delivery_person_Ratings'] = df1['Delivery_person_Ratings'].astype(float) 
-
-    df1['Order_Date'] = pd.to_datetime(df1['Order_Date'], format='%d-%m-%Y')
-
-    df1['multiple_deliveries'] = df1['multiple_deliveries'].astype(int)
-
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].str.slice(6)
-
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].astype(int)
-
-    # Removendo espaços do campo
-
-    df1 = df1.reset_index(drop=True)
-
-    df1['ID'] = df1.loc[:, 'ID'].str.strip()
-    df1['Delivery_person_ID'] = df1['Delivery_person_ID'].str.strip()
-    df1['Type_of_order'] = df1['Type_of_order'].str.strip()
-    df1['Type_of_vehicle'] = df1['Type_of_vehicle'].str.strip()
-    df1['Type_of_vehicle'] = df1['Type_of_vehicle'].str.strip()
-    df1['Road_traffic_density'] = df1['Road_traffic_density'].str.strip()
-    df1['Festival'] = df1['Festival'].str.strip()
-    
-    return df1
-
-
-
 # ------------------------------------ Início da estrutura lógica do código ---------------------------------------------------
 
 
 #================================================================================
-#==========        Importando dataset
-#================================================================================
-
-df = pd.read_csv('dataset/train.csv')
-
-
-#================================================================================
-#==========        Limpando os dados
+#==========        Importando e limpando o dataset (cache compartilhado)
 #================================================================================
 
-df1 = clean_code(df)
+df1 = load_data()
 
 
 
@@ -183,21 +112,13 @@ df1 = clean_code(df)
 
 st.header('Marketplace - Visão Cliente')
 
-image = Image.open('target3.jpeg')
-st.sidebar.image(image, width=120)
+st.sidebar.image(load_image('target3.jpeg'), width=120)
 
 st.sidebar.markdown('# Curry Company')
 st.sidebar.markdown('## Fastest Delivery in Town')
 st.sidebar.markdown("""___""")
 
-st.sidebar.markdown('## Selecione uma data limite')
-
-date_slider= st.sidebar.slider(
-    'Até qual valor?',
-    value=datetime.datetime(2022,4,6),
-    min_value=datetime.datetime(2022,2,11),
-    max_value=datetime.datetime(2022,4,6),
-    format='DD-MM-YYYY')
+date_start, date_slider = date_filter()
 
 st.sidebar.markdown("""___""")
 
@@ -206,31 +127,32 @@ traffic_options = st.sidebar.multiselect(
     ['Low', 'Medium', 'High', 'Jam'],
     default='Low')
 st.sidebar.markdown("""___""")
-st.sidebar.markdown('### Powered by Comunidade DS')
-
-# Filtro de data
 
-linhas_selecionadas = df1['Order_Date'] <= date_slider
-df1 = df1.loc[linhas_selecionadas, :]
+exact_couriers = st.sidebar.checkbox('Contagem exata de entregadores', value=False)
+st.sidebar.markdown("""___""")
+st.sidebar.markdown('### Powered by Comunidade DS')
 
+# Filtros ativos (os KPIs vêm de curry.kpis, calculados sobre o cubo e o
+# índice bitmap, com cache compartilhado com a API)
+filtros = dict(date_min=date_start, date_max=date_slider, traffic=traffic_options)
 
-# Filtro de transito
-linhas_selecionadas = df1['Road_traffic_density'].isin(traffic_options)
-df1 = df1.loc[linhas_selecionadas, :]
+# Chave dos filtros ativos para o cache de figuras
+filtros_key = filter_key(**filtros)
 
 
 #=======================================
 # Layout Empresa
 #=======================================
 
-tab1, tab2, tab3 = st.tabs(['Visão Gerencial', 'Visão Tática', 'Visão Geográfica'])
+# Só a visão ativa é calculada a cada rerun
+view = view_selector(['Visão Gerencial', 'Visão Tática', 'Visão Geográfica'])
 
-with tab1:
+if view == 'Visão Gerencial':
     with st.container():
         
         # Order Metric
         st.markdown('## Orders by Day')
-        fig = order_metric(df1)
+        fig = cached_figure('empresa', 'order_metric', filtros_key, lambda: order_metric(filtros))
         st.plotly_chart(fig, use_container_width=True)
         
     with st.container():
@@ -239,34 +161,46 @@ with tab1:
         with col1:
             
             st.header('Traffic Order Share')
-            fig = traffic_order_share(df1)
+            fig = cached_figure('empresa', 'traffic_order_share', filtros_key, lambda: traffic_order_share(filtros))
             st.plotly_chart(fig, use_container_width=True)
             
         with col2:
             
             st.header('Traffic Order City')
-            fig = traffic_order_citty(df1)
+            fig = cached_figure('empresa', 'traffic_order_citty', filtros_key, lambda: traffic_order_citty(filtros))
             st.plotly_chart(fig, use_container_width=True)
                   
             
-with tab2:
+elif view == 'Visão Tática':
     with st.container():
         
         st.markdown('## Order by Week')
-        fig = order_by_week(df1)
+        fig = cached_figure('empresa', 'order_by_week', filtros_key, lambda: order_by_week(filtros))
         st.plotly_chart(fig, use_container_width=True)
         
     
     with st.container():
         
         st.markdown('## Order Share by Week')
-        fig = order_share_by_week(df1)
+        fig = cached_figure('empresa', 'order_share_by_week', filtros_key + (exact_couriers,),
+                            lambda: order_share_by_week(filtros, exact_couriers))
         st.plotly_chart(fig, use_container_width=True)
         
         
     
-with tab3:
+elif view == 'Visão Geográfica':
+    
+    def filtered_frame():
+        # Filtros de data e de transito (índice bitmap, um único recorte do dataframe)
+        with span('filtro_data_transito', rows_in=len(df1)) as etapa:
+            df_aux = df1.take(filtered_positions(**filtros))
+            etapa.rows_out = len(df_aux)
+        return df_aux
     
     st.markdown('## Country Maps')
-    country_maps(df1)
-    
\ No newline at end of file
+    map_key = (dataset_version(),) + filtros_key
+    country_maps(map_key, filtered_frame)
+
+
+# Painel de desempenho da execução (apenas com a instrumentação ligada)
+render_profiler(profiler)
@@ -7,14 +7,24 @@ import pandas as pd
 import numpy as np 
 import plotly.express as px
 import plotly.graph_objects as go
-from haversine import haversine
-import datetime
-from PIL import Image
-import folium
-from streamlit_folium import folium_static
+
+from curry.api import serve_alongside_ui
+from curry.data import load_data
+from curry.figcache import cached_figure
+from curry.filters import date_filter, load_image, view_selector
+from curry.kpis import compute, filter_key, filtered_positions
+from curry.parallel import run_sections
+from curry.profiling import profiled, render_profiler, span, start_profiler
+from curry.spatial import load_delivery_grid
 
 st.set_page_config(page_title='Visão Restaurantes', page_icon='🍛', layout='wide')
 
+# Instrumentação opcional (CURRY_PROFILE=1 ou ?profile=1 na URL)
+profiler = start_profiler('restaurantes')
+
+# API dos KPIs no mesmo processo (apenas com CURRY_API_PORT definida)
+serve_alongside_ui()
+
 #=====================================
 # Configuração global de visualização
 #=====================================
@@ -25,13 +35,10 @@ pd.set_option("display.max_columns", 21)
 #==========        Funções
 #================================================================================
 
-def avg_std_time_on_traffic(df1):
+@profiled
+def avg_std_time_on_traffic(filtros):
                 
-    df_aux = (df1.loc[:, ['Time_taken(min)', 'City', 'Road_traffic_density']]
-                .groupby(['City', 'Road_traffic_density'])
-                .aggregate(['mean', 'std']))
-    df_aux.columns = ['avg_time', 'std_time']
-    df_aux = df_aux.reset_index()
+    df_aux = compute('delivery_time_by_city_traffic', **filtros)
     
     # Plotando gráfico de barras
     fig = go.Figure()
@@ -41,12 +48,9 @@ def avg_std_time_on_traffic(df1):
     
     return fig 
 
-def avg_std_time_graph(df1):
-    df_aux = (df1.loc[:, ['Time_taken(min)', 'City']]
-                .groupby(['City'])
-                .aggregate(['mean', 'std']))
-    df_aux.columns = ['avg_time', 'std_time']
-    df_aux = df_aux.reset_index()
+@profiled
+def avg_std_time_graph(filtros):
+    df_aux = compute('delivery_time_by_city', **filtros)
         
     # Plotando gráfico de barras
     fig = go.Figure()
@@ -58,116 +62,105 @@ def avg_std_time_graph(df1):
     
     return fig
 
-def avg_std_time_delivery(df1, Festival, op):
+@profiled
+def avg_std_time_delivery(filtros, Festival, op):
     '''
         Esta função calcula o tempo médio e o desvio padrão do tempo de entrega.
         Parêmtros:
             Input:
-                -df: Dataframe com os dados necessários para o cálculo
+                -filtros: Filtros ativos (date_min, date_max, traffic, weather)
                 -op: Tipo de operação que precisa ser calculado
                     'avg_time': Calcula o tempo médio
                     'std_time': Calcula o desvio padrão do tempo
             Output:
                 -df: Dataframe com 2 colunas e 1 linha.                    
     '''
-    df_aux = df1.loc[:, ['Time_taken(min)', 'Festival']].groupby(['Festival']).aggregate(['mean', 'std'])
-    df_aux.columns = ['avg_time', 'std_time']
-    df_aux = df_aux.reset_index()
+    df_aux = compute('delivery_time_by_festival', **filtros)
     linhas_selecionadas = df_aux['Festival'] == Festival
     df_aux = np.round(df_aux.loc[linhas_selecionadas,op],2)
     
     return df_aux
 
-def distance(df1, fig):
+@profiled
+def time_percentiles(filtros):
+    
+    '''
+        Esta função retorna os percentis (p50, p90 e p99) do tempo de entrega
+        no período, estimados pelos sketches (erro relativo de até 1%), com
+        1 casa decimal.
+    '''
+    
+    df_aux = compute('delivery_time_percentiles', **filtros)
+    return np.round(df_aux.loc[0, ['p50', 'p90', 'p99']], 1)
+
+@profiled
+def time_percentiles_graph(filtros):
+    
+    '''
+        Esta função gera o gráfico de barras dos percentis do tempo de
+        entrega por cidade.
+    '''
+    
+    df_aux = compute('delivery_time_percentiles_by_city', **filtros)
+    fig = px.bar(df_aux, x='City', y=['p50', 'p90', 'p99'], barmode='group',
+                 labels={'value': 'Tempo de entrega (min)', 'variable': 'Percentil'})
+    return fig
+
+@profiled
+def distance(filtros, fig):
+    
+    '''
+        Esta função agrega a distância (calculada uma única vez na preparação
+        do dataset) a partir do cubo.
+            fig == False: retorna a distância média
+            fig == True: retorna o gráfico de pizza da distância média por cidade
+    '''
+    
     if fig ==False:
-        cols = ['Delivery_location_latitude', 'Delivery_location_longitude', 'Restaurant_latitude', 'Restaurant_longitude']
-        df1['distance'] = (df1.loc[:, cols]
-                            .apply(lambda x: haversine( (x['Restaurant_latitude'], x['Restaurant_longitude']), (x['Delivery_location_latitude'], x['Delivery_location_longitude'])), axis=1))
-        
-        avg_distance = np.round(df1['distance'].mean(),2)
+        avg_distance = compute('avg_distance', **filtros)
         return avg_distance
     else:
-        cols = ['Delivery_location_latitude', 'Delivery_location_longitude', 'Restaurant_latitude', 'Restaurant_longitude']
-        df1['distance'] = (df1.loc[:, cols].apply(lambda x: haversine( (x['Restaurant_latitude'], x['Restaurant_longitude']), (x['Delivery_location_latitude'], x['Delivery_location_longitude'])), axis=1))
-        avg_distance = df1.loc[:, ['City', 'distance']].groupby('City').mean().reset_index()
+        avg_distance = compute('distance_by_city', **filtros)
         # gráfico de pizza
         fig = go.Figure(data=[go.Pie(labels=avg_distance['City'], values=avg_distance['distance'], pull=[0,0.1,0])])
         return fig   
     
 
-def clean_code(df1):
+@profiled
+def distance_histogram_graph(filtros):
     
-    ''' 
-        Esta função tem a responsabilidade de limpar o dataframe
-
-        Tipos de Limpeza:
-        1. Remoção dos dados NaN
-        2. Mudança do tipo da coluna de dados
-        3. Remoção dos espaços das variáveis de texto
-        4. Formatação da coluna de data
-        5. Limpeza da coluna de tempo (Remoção do texto da variável numérica)
-        
-        Input: Dataframe
-        Output: Dataframe
+    '''
+        Esta função gera o histograma da distância de entrega por cidade, com
+        os intervalos calculados no servidor.
     '''
     
-    linhas_selecionadas = df['Delivery_person_Age'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :] 
-
-    linhas_selecionadas = df['Road_traffic_density'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :] 
-
-    linhas_selecionadas = df1['multiple_deliveries'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :]
-
-    linhas_selecionadas = df1['City'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :]
-
-    linhas_selecionadas = df1['Festival'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :]
-
-    df1['Delivery_person_Age'] = df1['Delivery_person_Age'].astype(int)
-
-    df1['Delivery_person_Ratings'] = df1['Delivery_person_Ratings'].astype(float) 
-
-    df1['Order_Date'] = pd.to_datetime(df1['Order_Date'], format='%d-%m-%Y')
-
-    df1['multiple_deliveries'] = df1['multiple_deliveries'].astype(int)
-
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].str.slice(6)
-
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].astype(int)
-
-    # Removendo espaços do campo
-
-    df1 = df1.reset_index(drop=True)
+    df_aux = compute('delivery_distance_histogram', **filtros)
+    fig = px.bar(df_aux, x='distance_km', y='orders', color='City', barmode='group')
+    return fig
 
-    df1['ID'] = df1.loc[:, 'ID'].str.strip()
-    df1['Delivery_person_ID'] = df1['Delivery_person_ID'].str.strip()
-    df1['Type_of_order'] = df1['Type_of_order'].str.strip()
-    df1['Type_of_vehicle'] = df1['Type_of_vehicle'].str.strip()
-    df1['Type_of_vehicle'] = df1['Type_of_vehicle'].str.strip()
-    df1['Road_traffic_density'] = df1['Road_traffic_density'].str.strip()
-    df1['Festival'] = df1['Festival'].str.strip()
+@profiled
+def orders_within_radius(posicoes, latitude, longitude, raio):
     
-    return df1
+    '''
+        Esta função consulta o índice espacial e retorna, entre as linhas
+        filtradas (posicoes), a quantidade de pedidos entregues a até raio km
+        do ponto e o tempo mediano dessas entregas.
+    '''
+    
+    no_raio = np.intersect1d(load_delivery_grid().within(latitude, longitude, raio), posicoes, assume_unique=True)
+    tempos = load_data()['Time_taken(min)'].to_numpy()[no_raio]
+    tempo_mediano = np.median(tempos) if len(tempos) else np.nan
+    return len(no_raio), tempo_mediano
 
 
 # ------------------------------------ Início da estrutura lógica do código ---------------------------------------------------
 
 
 #================================================================================
-#==========        Importando dataset
-#================================================================================
-
-df = pd.read_csv('dataset/train.csv')
-
-
-#================================================================================
-#==========        Limpando os dados
+#==========        Importando e limpando o dataset (cache compartilhado)
 #================================================================================
 
-df1 = clean_code(df)
+df1 = load_data()
 
 
 #=======================================
@@ -177,8 +170,7 @@ df1 = clean_code(df)
 st.header('Marketplace - Visão Restaurantes')
 
 #image_path = '/home/nicolas/Documentos/repos/03_FTC/Modulo_06/03_Imagens/target3.jpeg'
-image = Image.open('target3.jpeg')
-st.sidebar.image(image, width=120)
+st.sidebar.image(load_image('target3.jpeg'), width=120)
 
 st.sidebar.markdown('# Curry Company')
 st.sidebar.markdown('## Fastest Delivery in Town')
@@ -188,14 +180,7 @@ st.sidebar.markdown("""___""")
 # Filtro de data
 #=====================================
 
-st.sidebar.markdown('## Selecione uma data limite')
-
-date_slider= st.sidebar.slider(
-    'Até qual valor?',
-    value=datetime.datetime(2022,4,6),
-    min_value=datetime.datetime(2022,2,11),
-    max_value=datetime.datetime(2022,4,6),
-    format='DD-MM-YYYY')
+date_start, date_slider = date_filter()
 
 st.sidebar.markdown("""___""")
 
@@ -219,74 +204,112 @@ Weatherconditions_options = st.sidebar.multiselect(
     default='conditions Cloudy')
 st.sidebar.markdown("""___""")
 
-st.sidebar.markdown('### Powered by Comunidade DS')
-
-#=====================================
-# Filtro de data
-#=====================================
+exact_couriers = st.sidebar.checkbox('Contagem exata de entregadores', value=False)
+st.sidebar.markdown("""___""")
 
-linhas_selecionadas = df1['Order_Date'] <= date_slider
-df1 = df1.loc[linhas_selecionadas, :]
+st.sidebar.markdown('### Powered by Comunidade DS')
 
 #=====================================
-# Filtro de transito
+# Filtros de data, transito e clima
+# (índice bitmap, um único recorte do dataframe)
 #=====================================
 
-linhas_selecionadas = df1['Road_traffic_density'].isin(traffic_options)
-df1 = df1.loc[linhas_selecionadas, :]
+# Os KPIs vêm de curry.kpis, calculados sobre o índice bitmap e o cubo, com
+# cache compartilhado com a API
+filtros = dict(date_min=date_start, date_max=date_slider, traffic=traffic_options, weather=Weatherconditions_options)
 
-#=====================================
-# Filtro de Clima
-#=====================================
+# Chave dos filtros ativos para o cache de figuras
+filtros_key = filter_key(**filtros)
 
-linhas_selecionadas = df1['Weatherconditions'].isin(Weatherconditions_options)
-df1 = df1.loc[linhas_selecionadas, :]
+with span('filtro_data_transito_clima', rows_in=len(df1)) as etapa:
+    linhas_selecionadas = filtered_positions(**filtros)
+    etapa.rows_out = len(linhas_selecionadas)
 
 
 #=====================================
 #==== Layout Restaurantes
 #=====================================
 
-tab1, tab2, tab3 = st.tabs(['Visão Gerencial', '_', '_'])
+#=====================================
+# Cálculo das seções
+#=====================================
 
-with tab1:
+@profiled
+def city_order_table():
+    df_aux = compute('delivery_time_by_city_order_type', **filtros)
+    return df_aux.rename(columns={'avg_time': 'avg_order', 'std_time': 'std_order'})
+
+# As seções só leem os dados filtrados: são calculadas juntas e desenhadas
+# depois, na ordem do layout
+with span('secoes'):
+    secoes = run_sections({
+        # Contagem exata ou estimativa HyperLogLog (erro relativo ~2%)
+        'delivery_unique': lambda: compute('unique_couriers', **filtros, exact=exact_couriers),
+        'avg_distance': lambda: distance(filtros, False),
+        'festival_avg': lambda: avg_std_time_delivery(filtros, 'Yes', 'avg_time'),
+        'festival_std': lambda: avg_std_time_delivery(filtros, 'Yes', 'std_time'),
+        'normal_avg': lambda: avg_std_time_delivery(filtros, 'No', 'avg_time'),
+        'normal_std': lambda: avg_std_time_delivery(filtros, 'No', 'std_time'),
+        'avg_std_time_graph': lambda: cached_figure('restaurantes', 'avg_std_time_graph', filtros_key, lambda: avg_std_time_graph(filtros)),
+        'distance': lambda: cached_figure('restaurantes', 'distance', filtros_key, lambda: distance(filtros, True)),
+        'avg_std_time_on_traffic': lambda: cached_figure('restaurantes', 'avg_std_time_on_traffic', filtros_key, lambda: avg_std_time_on_traffic(filtros)),
+        'city_order_table': city_order_table,
+        'time_percentiles': lambda: time_percentiles(filtros),
+        'time_percentiles_graph': lambda: cached_figure('restaurantes', 'time_percentiles_graph', filtros_key, lambda: time_percentiles_graph(filtros)),
+        'time_percentiles_table': lambda: compute('delivery_time_percentiles_by_city_traffic', **filtros).round(1),
+        'raio_restaurantes': lambda: compute('restaurant_radius', **filtros),
+        'distance_histogram_graph': lambda: cached_figure('restaurantes', 'distance_histogram_graph', filtros_key, lambda: distance_histogram_graph(filtros)),
+    })
+
+# Só a visão ativa é calculada a cada rerun
+view = view_selector(['Visão Gerencial'])
+
+if view == 'Visão Gerencial':
     with st.container():
         st.markdown('##### Overall Metrics')
         col1, col2, col3, col4, col5, col6 = st.columns(6)
         
         with col1:
-            delivery_unique = len((df1['Delivery_person_ID'].unique()))
-            col1.metric('Entregadores', delivery_unique)
+            col1.metric('Entregadores', secoes['delivery_unique'])
         
         with col2:
-            avg_distance = distance(df1, False)
-            col2.metric('Distância média', avg_distance)         
-            
+            col2.metric('Distância média', secoes['avg_distance'])         
             
         with col3:
-                        
-            df_aux = avg_std_time_delivery(df1, 'Yes', 'avg_time')    
-            col3.metric('Tempo médio', df_aux)
+            col3.metric('Tempo médio', secoes['festival_avg'])
             
         with col4:
-            
-            df_aux = avg_std_time_delivery(df1, 'Yes', 'std_time')    
-            col4.metric('STD Entrega', df_aux)
+            col4.metric('STD Entrega', secoes['festival_std'])
             
         with col5:
-            
-            df_aux = avg_std_time_delivery(df1, 'No', 'avg_time')    
-            col5.metric('Tempo médio', df_aux)
+            col5.metric('Tempo médio', secoes['normal_avg'])
             
         with col6:
-            df_aux = avg_std_time_delivery(df1, 'No', 'std_time')    
-            col6.metric('STD Entrega', df_aux)
+            col6.metric('STD Entrega', secoes['normal_std'])
     
     with st.container():
         st.markdown("""___""")
         st.markdown('##### Tempo médio de entrega por cidade')
-        fig = avg_std_time_graph(df1)
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(secoes['avg_std_time_graph'], use_container_width=True)
+        
+    
+    with st.container():
+        st.markdown("""___""")
+        st.markdown('##### Percentis do tempo de entrega (SLA)')
+        
+        col1, col2, col3 = st.columns(3)
+        col1.metric('p50', secoes['time_percentiles']['p50'])
+        col2.metric('p90', secoes['time_percentiles']['p90'])
+        col3.metric('p99', secoes['time_percentiles']['p99'])
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            
+            st.plotly_chart(secoes['time_percentiles_graph'])
+            
+        with col2:
+            
+            st.dataframe(secoes['time_percentiles_table'])
         
     
     with st.container():
@@ -296,22 +319,53 @@ with tab1:
         col1, col2 = st.columns(2)
         with col1:
             
-            fig = distance(df1, True)
-            st.plotly_chart(fig)
+            st.plotly_chart(secoes['distance'])
             
         
         with col2:
             
-            fig = avg_std_time_on_traffic(df1)
-            st.plotly_chart(fig)
+            st.plotly_chart(secoes['avg_std_time_on_traffic'])
             
         
     with st.container():
         st.markdown("""___""")
         st.markdown('##### Distribuição da distância')
-        df_aux = df1.loc[:, ['Type_of_order', 'Time_taken(min)', 'City']].groupby(['City', 'Type_of_order']).aggregate(['mean', 'std'])
-        df_aux.columns = ['avg_order', 'std_order']
-        df_aux = df_aux.reset_index()
-        st.dataframe(df_aux)
+        st.dataframe(secoes['city_order_table'])
+        
+        st.markdown("""___""")
         
-        st.markdown("""___""")
\ No newline at end of file
+    with st.container():
+        st.markdown('##### Raio de entrega dos restaurantes')
+        raio_restaurantes = secoes['raio_restaurantes']
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            
+            st.plotly_chart(secoes['distance_histogram_graph'])
+            
+        with col2:
+            
+            st.dataframe(raio_restaurantes)
+        
+        if len(raio_restaurantes):
+            col1, col2, col3, col4 = st.columns(4)
+            
+            restaurante = col1.selectbox(
+                'Restaurante',
+                raio_restaurantes.index,
+                format_func=lambda i: '{:.4f}, {:.4f}'.format(raio_restaurantes.loc[i, 'Restaurant_latitude'],
+                                                              raio_restaurantes.loc[i, 'Restaurant_longitude']))
+            raio = col2.slider('Raio (km)', min_value=1, max_value=50, value=5)
+            
+            pedidos_raio, tempo_raio = orders_within_radius(linhas_selecionadas,
+                                                            raio_restaurantes.loc[restaurante, 'Restaurant_latitude'],
+                                                            raio_restaurantes.loc[restaurante, 'Restaurant_longitude'],
+                                                            raio)
+            col3.metric('Pedidos no raio', pedidos_raio)
+            col4.metric('Tempo mediano', tempo_raio)
+        
+        st.markdown("""___""")
+
+
+# Painel de desempenho da execução (apenas com a instrumentação ligada)
+render_profiler(profiler)
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATASET = os.path.join(ROOT, 'dataset', 'train.csv')
+
+
+@pytest.fixture
+def dataset_path(monkeypatch):
+    # O dataset não faz parte do repositório: os testes que o usam são pulados sem ele
+    if not os.path.exists(DATASET):
+        pytest.skip('dataset/train.csv ausente')
+    # Os KPIs leem o caminho padrão (relativo à raiz do repositório)
+    monkeypatch.chdir(ROOT)
+    return DATASET
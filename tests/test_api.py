@@ -0,0 +1,64 @@
+import json
+import threading
+from urllib.error import HTTPError
+from urllib.parse import parse_qs
+from urllib.request import urlopen
+
+import pytest
+
+from curry import api
+
+
+@pytest.mark.parametrize('nome, query', [
+    ('top_couriers', 'k=0'),
+    ('top_couriers', 'k=-3'),
+    ('top_couriers', 'k=51'),
+    ('delivery_distance_histogram', 'bins=0'),
+    ('delivery_distance_histogram', 'bins=100000000'),
+    ('orders_by_day', 'date_max='),
+    ('orders_by_day', 'date_min=%20'),
+    ('orders_by_day', 'date_max=NaT'),
+])
+def test_parse_request_rejects_invalid_params(nome, query):
+    with pytest.raises(ValueError):
+        api.parse_request(nome, parse_qs(query, keep_blank_values=True))
+
+
+def test_parse_request_accepts_valid_params():
+    filtros, params = api.parse_request('top_couriers', parse_qs('k=3&date_max=2022-03-15&traffic=Low,Jam'))
+    assert params == {'k': 3}
+    assert str(filtros['date_max'].date()) == '2022-03-15'
+    assert filtros['traffic'] == ['Low', 'Jam']
+
+
+def get(server, path):
+    try:
+        with urlopen('http://127.0.0.1:{}{}'.format(server.server_port, path)) as resposta:
+            return resposta.status, json.loads(resposta.read())
+    except HTTPError as erro:
+        return erro.code, json.loads(erro.read())
+
+
+@pytest.fixture
+def server():
+    server = api.ThreadingHTTPServer(('127.0.0.1', 0), api.KPIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_invalid_params_answer_400(server):
+    for path in ('/kpis/top_couriers?k=0', '/kpis/delivery_distance_histogram?bins=0',
+                 '/kpis/delivery_distance_histogram?bins=100000000', '/kpis/orders_by_day?date_max='):
+        status, body = get(server, path)
+        assert status == 400 and 'error' in body
+
+
+def test_kpi_errors_answer_json_500(server, monkeypatch):
+    def falha(*args, **kwargs):
+        raise RuntimeError('falhou')
+    monkeypatch.setattr(api, 'kpi_response', falha)
+    status, body = get(server, '/kpis/orders_by_day')
+    assert status == 500
+    assert body == {'error': 'RuntimeError: falhou'}
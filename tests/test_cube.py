@@ -0,0 +1,55 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from curry.cube import DIMENSIONS, PrefixCube, build_cube
+from curry.data import load_data, widen
+
+
+RANGES = [
+    dict(),
+    dict(date_min=datetime.datetime(2022, 3, 1), date_max=datetime.datetime(2022, 3, 15)),
+    dict(date_max=datetime.datetime(2022, 2, 20), traffic=['Low', 'Jam']),
+    dict(date_min=datetime.datetime(2022, 3, 10), weather=['conditions Sunny']),
+    dict(date_min=datetime.datetime(2022, 3, 15), date_max=datetime.datetime(2022, 3, 1)),
+]
+
+
+def direct_totals(df1, date_min=None, date_max=None, traffic=None, weather=None):
+    linhas_selecionadas = np.ones(len(df1), dtype=bool)
+    if date_min is not None:
+        linhas_selecionadas &= (df1['Order_Date'] >= date_min).to_numpy()
+    if date_max is not None:
+        linhas_selecionadas &= (df1['Order_Date'] <= date_max).to_numpy()
+    if traffic is not None:
+        linhas_selecionadas &= df1['Road_traffic_density'].isin(traffic).to_numpy()
+    if weather is not None:
+        linhas_selecionadas &= df1['Weatherconditions'].isin(weather).to_numpy()
+    
+    df_aux = df1.loc[linhas_selecionadas, DIMENSIONS[1:]]
+    df_aux['count'] = 1
+    df_aux['time_sum'] = widen(df1.loc[linhas_selecionadas, 'Time_taken(min)'])
+    df_aux['distance_sum'] = widen(df1.loc[linhas_selecionadas, 'distance'])
+    return df_aux.groupby(DIMENSIONS[1:], sort=True, observed=True).sum().reset_index()
+
+
+@pytest.fixture
+def df1(dataset_path):
+    return load_data()
+
+
+def test_prefix_totals_equal_direct_sum(df1):
+    prefix = PrefixCube(build_cube(df1))
+    for filtros in RANGES:
+        totais = prefix.totals(**filtros)
+        esperado = direct_totals(df1, **filtros)
+        
+        chave = DIMENSIONS[1:]
+        totais = totais.astype({col: str for col in chave}).sort_values(chave).reset_index(drop=True)
+        esperado = esperado.astype({col: str for col in chave}).sort_values(chave).reset_index(drop=True)
+        pd.testing.assert_frame_equal(totais[chave], esperado[chave])
+        assert totais['count'].tolist() == esperado['count'].tolist(), filtros
+        np.testing.assert_allclose(totais['time_sum'], esperado['time_sum'], rtol=1e-9)
+        np.testing.assert_allclose(totais['distance_sum'], esperado['distance_sum'], rtol=1e-9)
@@ -0,0 +1,33 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from curry import data
+from curry.data import widen
+
+
+def test_widen_recovers_decimal_values_from_float32():
+    valores = pd.Series([3.9, 4.7, 0.0, np.nan, 21.192511], dtype='float32')
+    largos = widen(valores)
+    assert largos.dtype == 'float64'
+    assert largos.iloc[:3].tolist() == [3.9, 4.7, 0.0]
+    assert np.isnan(largos.iloc[3])
+    assert abs(largos.iloc[4] / 21.192511 - 1) < 1e-6
+
+
+def test_widen_integers_to_int64():
+    assert widen(pd.Series([1, 2], dtype='int8')).dtype == 'int64'
+
+
+def test_workers_pick_up_republished_shared_file(dataset_path, tmp_path):
+    path = str(tmp_path / 'train.csv')
+    shutil.copy(dataset_path, path)
+    antigo = data.load_data(path)
+    assert data.load_data(path) is antigo
+    
+    # Nova ingestão: o arquivo compartilhado é regravado e o CSV fica igual
+    data.publish_shared(path, rebuild=True)
+    novo = data.load_data(path)
+    assert novo is not antigo
+    assert novo.equals(antigo)
@@ -0,0 +1,40 @@
+import datetime
+import itertools
+
+import numpy as np
+import pytest
+
+from curry.data import load_data
+from curry.index import BitmapIndex
+
+
+FILTERS = [dict(date_min=date_min, date_max=date_max, traffic=traffic, weather=weather)
+           for date_min, date_max, traffic, weather in itertools.product(
+               [None, datetime.datetime(2022, 3, 1)],
+               [None, datetime.datetime(2022, 3, 15), datetime.datetime(2022, 1, 1)],
+               [None, [], ['Low'], ['Medium', 'Jam', 'inexistente']],
+               [None, ['conditions Sunny', 'conditions Fog']])]
+
+
+def mask_positions(df1, date_min=None, date_max=None, traffic=None, weather=None):
+    linhas_selecionadas = np.ones(len(df1), dtype=bool)
+    if date_min is not None:
+        linhas_selecionadas &= (df1['Order_Date'] >= date_min).to_numpy()
+    if date_max is not None:
+        linhas_selecionadas &= (df1['Order_Date'] <= date_max).to_numpy()
+    if traffic is not None:
+        linhas_selecionadas &= df1['Road_traffic_density'].isin(traffic).to_numpy()
+    if weather is not None:
+        linhas_selecionadas &= df1['Weatherconditions'].isin(weather).to_numpy()
+    return np.flatnonzero(linhas_selecionadas)
+
+
+@pytest.fixture
+def df1(dataset_path):
+    return load_data()
+
+
+def test_positions_match_boolean_mask(df1):
+    index = BitmapIndex(df1)
+    for filtros in FILTERS:
+        assert np.array_equal(index.positions(**filtros), mask_positions(df1, **filtros)), filtros
@@ -0,0 +1,11 @@
+import pytest
+
+from curry import ingest
+
+
+def test_stream_requires_output_for_several_csvs(tmp_path, capsys):
+    caminhos = [str(tmp_path / 'a.csv'), str(tmp_path / 'b.csv')]
+    with pytest.raises(SystemExit):
+        ingest.main(['--stream'] + caminhos)
+    assert '--output' in capsys.readouterr().err
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,51 @@
+import datetime
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from curry import kpis, materialize
+
+
+FILTERS = [
+    dict(),
+    dict(date_max=datetime.datetime(2022, 3, 1), traffic=['Low', 'Jam']),
+    dict(date_max=datetime.datetime(2022, 3, 15), weather=['conditions Sunny']),
+    dict(traffic=['Medium'], weather=['conditions Fog', 'conditions Stormy']),
+    dict(date_max=datetime.datetime(2022, 3, 20), traffic=[], weather=['conditions Cloudy']),
+]
+
+NAMES = list(materialize.CUMULATIVE_KPIS) + materialize.DAILY_KPIS + materialize.SKETCH_KPIS
+
+
+@pytest.fixture
+def dataset_copy(dataset_path, tmp_path, monkeypatch):
+    # Cópia do CSV no caminho padrão (relativo): o store é gravado ao lado
+    # dela, e os KPIs e o store leem a cópia
+    os.makedirs(tmp_path / 'dataset')
+    shutil.copy(dataset_path, tmp_path / 'dataset' / 'train.csv')
+    monkeypatch.chdir(tmp_path)
+
+
+def assert_same(calculado, lido):
+    if isinstance(calculado, pd.DataFrame):
+        pd.testing.assert_frame_equal(calculado.reset_index(drop=True), lido, rtol=1e-9)
+    elif pd.isna(calculado):
+        assert pd.isna(lido)
+    else:
+        assert np.isclose(calculado, lido, rtol=1e-9)
+
+
+def test_materialized_equals_compute(dataset_copy):
+    # Sem store, compute calcula na hora
+    assert materialize.load_store() is None
+    calculados = {(nome, i): kpis.compute(nome, **filtros) for nome in NAMES for i, filtros in enumerate(FILTERS)}
+    
+    materialize.materialize()
+    assert materialize.load_store() is not None
+    for (nome, i), calculado in calculados.items():
+        lido = materialize.materialized(nome, **FILTERS[i])
+        assert lido is not None, (nome, FILTERS[i])
+        assert_same(calculado, lido)
@@ -0,0 +1,22 @@
+import pandas as pd
+import pytest
+
+from curry.ranking import top_bottom_k
+
+
+@pytest.fixture
+def df_aux():
+    return pd.DataFrame({'City': ['A'] * 5 + ['B'] * 3,
+                         'Time_taken(min)': [5, 1, 4, 2, 3, 9, 7, 8]})
+
+
+def test_top_bottom_k(df_aux):
+    menores, maiores = top_bottom_k(df_aux, 'City', 'Time_taken(min)', k=2)
+    assert menores['Time_taken(min)'].tolist() == [1, 2, 7, 8]
+    assert maiores['Time_taken(min)'].tolist() == [5, 4, 9, 8]
+
+
+@pytest.mark.parametrize('k', [0, -3])
+def test_top_bottom_k_rejects_k_below_one(df_aux, k):
+    with pytest.raises(ValueError, match='k deve ser pelo menos 1'):
+        top_bottom_k(df_aux, 'City', 'Time_taken(min)', k=k)
@@ -0,0 +1,38 @@
+import shutil
+
+import pytest
+
+from curry import data, readonly
+
+
+@pytest.fixture
+def shared_frame(dataset_path, tmp_path, monkeypatch):
+    # Cópia do CSV: o dataframe é construído do zero, já no modo de teste, e
+    # as alterações não chegam ao cache dos outros testes
+    monkeypatch.setattr(readonly, 'ASSERT_READONLY', True)
+    path = str(tmp_path / 'train.csv')
+    shutil.copy(dataset_path, path)
+    return path, data.load_data(path)
+
+
+def test_writing_values_raises(shared_frame):
+    _, df1 = shared_frame
+    with pytest.raises(ValueError):
+        df1.loc[0, 'distance'] = 1.0
+    with pytest.raises(ValueError):
+        df1['Delivery_person_Age'].to_numpy()[0] = 3
+    with pytest.raises(ValueError):
+        df1['Order_Date'].to_numpy()[0] = df1['Order_Date'].iloc[1]
+
+
+def test_replacing_columns_raises_on_next_access(shared_frame):
+    path, df1 = shared_frame
+    df1['distance'] = 0.0
+    with pytest.raises(readonly.SharedFrameWriteError):
+        data.load_data(path)
+
+
+def test_unchanged_nan_result_passes(monkeypatch):
+    monkeypatch.setattr(readonly, 'ASSERT_READONLY', True)
+    valor = readonly.guard(float('nan'))
+    assert readonly.check(valor) is valor
@@ -0,0 +1,56 @@
+import datetime
+import itertools
+
+import numpy as np
+import pytest
+
+from curry import kpis
+from curry.sketches import RELATIVE_ACCURACY, load_sketches, quantile_labels
+
+
+GROUPINGS = [[], ['City'], ['City', 'Road_traffic_density'], ['Road_traffic_density', 'Weatherconditions']]
+
+FILTERS = [dict(date_max=date_max, traffic=traffic, weather=weather)
+           for date_max, traffic, weather in itertools.product(
+               [None, datetime.datetime(2022, 3, 1)],
+               [None, ['Low'], ['Medium', 'High']],
+               [None, ['conditions Cloudy', 'conditions Fog', 'conditions Stormy']])]
+
+
+@pytest.mark.parametrize('by', GROUPINGS, ids=lambda by: '-'.join(by) or 'total')
+def test_percentiles_within_relative_accuracy(dataset_path, by):
+    for filtros in FILTERS:
+        estimado = kpis.delivery_time_percentiles(by, **filtros)
+        exato = kpis.delivery_time_percentiles(by, **filtros, exact=True)
+        
+        # Mesmos grupos e contagens; os percentis dentro do erro do sketch
+        assert estimado[by + ['orders']].astype(str).equals(exato[by + ['orders']].astype(str))
+        a = estimado[quantile_labels()].to_numpy(dtype='float64')
+        b = exato[quantile_labels()].to_numpy(dtype='float64')
+        assert (np.isnan(a) == np.isnan(b)).all()
+        validos = ~np.isnan(b)
+        assert (np.abs(a[validos] - b[validos]) <= RELATIVE_ACCURACY * b[validos] + 1e-9).all(), filtros
+
+
+def test_empty_selection(dataset_path):
+    estimado = kpis.delivery_time_percentiles(['City'], traffic=[])
+    assert estimado.empty
+    total = kpis.delivery_time_percentiles([], traffic=[])
+    assert total['orders'].tolist() == [0] and total[quantile_labels()].isna().all(axis=None)
+
+
+@pytest.mark.parametrize('filtros', FILTERS)
+def test_distinct_couriers_within_error_bound(dataset_path, filtros):
+    # Três erros padrão do HyperLogLog (1.04 / sqrt(2**precision))
+    sketches = load_sketches()
+    limite = 3 * 1.04 / np.sqrt(1 << sketches.precision)
+    exato = kpis.unique_couriers(**filtros, exact=True)
+    assert abs(sketches.distinct(**filtros) - exato) <= limite * exato
+
+
+def test_distinct_couriers_by_week_within_error_bound(dataset_path):
+    limite = 3 * 1.04 / np.sqrt(1 << load_sketches().precision)
+    estimado = kpis.order_share_by_week()
+    exato = kpis.order_share_by_week(exact=True)
+    assert estimado['year_week'].tolist() == exato['year_week'].tolist()
+    assert (np.abs(estimado['couriers'] - exato['couriers']) <= limite * exato['couriers']).all()